@@ -1,10 +1,38 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, g, has_request_context
+from flask import Response, abort, stream_with_context
+from flask import session as flask_session
+from flask import before_render_template, template_rendered
+from flask_sqlalchemy.session import Session as FlaskSession
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from collections import OrderedDict
+from datetime import date, datetime
+from sqlalchemy import event as db_event, exc as db_exc
+from sqlalchemy.sql import elements as db_elements, util as db_sql_util
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool, QueuePool
+import base64
+import concurrent.futures
+import bisect
+import click
+import csv
+import functools
+import gc
+import io
+import itertools
 import json
+import math
 import os
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
 
 # Custom Jinja2 filters
 def from_json(value):
@@ -43,11 +71,345 @@ else:
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Connection pool (PostgreSQL and SQLite files). Each gunicorn worker holds up to
+# DB_POOL_SIZE + DB_MAX_OVERFLOW connections, so size these against the server's
+# max_connections divided by the number of workers.
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+app.config['DB_POOL_PRE_PING'] = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+app.config['DB_CONNECT_TIMEOUT'] = int(os.environ.get('DB_CONNECT_TIMEOUT', 10))
+
+# SQLite pragmas applied to every new connection. WAL lets readers run alongside
+# a writer, and busy_timeout makes a blocked writer wait instead of failing with
+# "database is locked".
+app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL').upper()
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+
+# Statements slower than this are logged with their route and parameter shape.
+# SQL_TIMING_HEADER adds a Server-Timing header with each request's query count
+# and database time.
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 200))
+app.config['SQL_TIMING_HEADER'] = os.environ.get('SQL_TIMING_HEADER', '').lower() in ('1', 'true', 'yes')
+
+# Optional read replicas (comma-separated URLs). GET requests read from a replica
+# unless the user committed a write in the last REPLICA_STICKY_SECONDS, in which
+# case they read from the primary so they see their own changes.
+app.config['DATABASE_REPLICA_URLS'] = [
+    url.strip().replace('postgres://', 'postgresql://', 1)
+    for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()
+]
+app.config['REPLICA_STICKY_SECONDS'] = float(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+
+# Create the schema and seed an empty database when create_app() is called.
+# Off by default: deployments run `flask init-db` and `flask seed-db` once instead
+# of every worker doing it (and racing to seed) at startup.
+app.config['AUTO_INIT_DB'] = os.environ.get('AUTO_INIT_DB', '').lower() in ('1', 'true', 'yes')
+
+# Seconds a signed-in user's account is served from memory. Changes made in this
+# worker apply at once; other workers pick up edits and deactivations within this
+# time. 0 looks the user up on every request. IDENTITY_CACHE_SIZE caps how many
+# accounts are held at once; the least recently signed-in are dropped first.
+app.config['IDENTITY_CACHE_TTL'] = float(os.environ.get('IDENTITY_CACHE_TTL', 30))
+app.config['IDENTITY_CACHE_SIZE'] = int(os.environ.get('IDENTITY_CACHE_SIZE', 10000))
+
+# Maximum number of compiled permission matrices kept per worker process
+app.config['PERMISSION_CACHE_SIZE'] = int(os.environ.get('PERMISSION_CACHE_SIZE', 10000))
+
+# List view paging
+app.config['LIST_PAGE_SIZE'] = int(os.environ.get('LIST_PAGE_SIZE', 50))
+app.config['LIST_MAX_PAGE_SIZE'] = int(os.environ.get('LIST_MAX_PAGE_SIZE', 200))
+
+# Seconds a computed dashboard payload is served before it is rebuilt
+app.config['DASHBOARD_CACHE_TTL'] = float(os.environ.get('DASHBOARD_CACHE_TTL', 30))
+
+# Maximum number of compiled custom object schemas kept per worker process
+app.config['CUSTOM_SCHEMA_CACHE_SIZE'] = int(os.environ.get('CUSTOM_SCHEMA_CACHE_SIZE', 1000))
+
+# Rows written per transaction by bulk imports
+app.config['IMPORT_BATCH_SIZE'] = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+
+# Rows fetched from the server-side cursor and sent per chunk by exports
+app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+# Maximum number of records in one JSON API batch request
+app.config['API_MAX_BATCH_SIZE'] = int(os.environ.get('API_MAX_BATCH_SIZE', 500))
+
+# Matches returned by the typeahead endpoint
+app.config['TYPEAHEAD_LIMIT'] = int(os.environ.get('TYPEAHEAD_LIMIT', 10))
+
+# Hits per page of global search results
+app.config['SEARCH_PAGE_SIZE'] = int(os.environ.get('SEARCH_PAGE_SIZE', 20))
+
+# Seconds before the in-process autocomplete index is reloaded in the background,
+# picking up changes committed by other worker processes
+app.config['AUTOCOMPLETE_MAX_AGE'] = float(os.environ.get('AUTOCOMPLETE_MAX_AGE', 300))
+app.config['AUTOCOMPLETE_MEMORY_BUDGET_MB'] = float(os.environ.get('AUTOCOMPLETE_MEMORY_BUDGET_MB', 256))
+
+# Password hashing. PASSWORD_HASH_METHOD is any Werkzeug method string with its
+# cost, e.g. pbkdf2:sha256:600000 or scrypt:32768:8:1; existing hashes are
+# upgraded on the user's next successful login. Hashing runs on a pool of
+# PASSWORD_HASH_WORKERS threads per worker process, and requests beyond
+# PASSWORD_HASH_QUEUE_LIMIT waiting checks are answered 503 instead of queueing.
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_QUEUE_LIMIT'] = int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT', 16))
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
+# Login throttling: sliding windows of LOGIN_WINDOW_SECONDS per client IP (all
+# attempts) and per username (failed attempts). Set LOGIN_THROTTLE_REDIS_URL to
+# share the windows between workers and instances; otherwise each worker keeps
+# its own. TRUSTED_PROXY_COUNT is the number of proxies in front of the app
+# (1 on Heroku, Render, Railway and Fly; their shipped configs set it) so client
+# IPs come from X-Forwarded-For.
+app.config['LOGIN_WINDOW_SECONDS'] = float(os.environ.get('LOGIN_WINDOW_SECONDS', 300))
+app.config['LOGIN_MAX_ATTEMPTS_PER_IP'] = int(os.environ.get('LOGIN_MAX_ATTEMPTS_PER_IP', 50))
+app.config['LOGIN_MAX_FAILURES_PER_USERNAME'] = int(os.environ.get('LOGIN_MAX_FAILURES_PER_USERNAME', 10))
+app.config['LOGIN_THROTTLE_MAX_KEYS'] = int(os.environ.get('LOGIN_THROTTLE_MAX_KEYS', 100000))
+app.config['LOGIN_THROTTLE_REDIS_URL'] = os.environ.get('LOGIN_THROTTLE_REDIS_URL')
+app.config['TRUSTED_PROXY_COUNT'] = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+
+# /metrics. With several gunicorn workers, point METRICS_DIR at a directory they
+# all share (cleared on deploy); each worker writes its totals there at most every
+# METRICS_FLUSH_SECONDS and /metrics adds them up. METRICS_TOKEN, when set, must be
+# sent as a bearer token.
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR')
+app.config['METRICS_FLUSH_SECONDS'] = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+if app.config['TRUSTED_PROXY_COUNT']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_COUNT'], x_proto=app.config['TRUSTED_PROXY_COUNT'])
+
 # Register custom Jinja2 filters
 app.jinja_env.filters['from_json'] = from_json
 app.jinja_env.filters['safe_json'] = safe_json_load
 
-db = SQLAlchemy(app)
+# Database engine configuration
+class PoolMetrics:
+    """Connection pool counters shared by every engine in the worker process."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def checked_out(self):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def checked_in(self):
+        with self._lock:
+            self.in_use -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'wait_seconds_total': round(self.wait_seconds, 6),
+                'wait_seconds_max': round(self.max_wait_seconds, 6)
+            }
+
+pool_metrics = PoolMetrics()
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a free connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except db_exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - started, timed_out)
+
+@db_event.listens_for(Pool, 'checkout')
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_metrics.checked_out()
+
+@db_event.listens_for(Pool, 'checkin')
+def _count_checkin(dbapi_connection, connection_record):
+    pool_metrics.checked_in()
+
+@db_event.listens_for(Engine, 'connect')
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}")
+    cursor.execute(f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}")
+    cursor.execute(f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}")
+    cursor.close()
+
+def engine_options(database_uri):
+    """Engine keyword arguments for a database URI, built from the DB_* and SQLITE_* settings."""
+    if database_uri.startswith('sqlite'):
+        if database_uri in ('sqlite://', 'sqlite:///:memory:'):
+            # Flask-SQLAlchemy gives in-memory databases a single shared connection
+            return {}
+        return {
+            'poolclass': MeteredQueuePool,
+            'pool_size': app.config['DB_POOL_SIZE'],
+            'max_overflow': app.config['DB_MAX_OVERFLOW'],
+            'pool_timeout': app.config['DB_POOL_TIMEOUT'],
+            'connect_args': {'timeout': app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}
+        }
+    options = {
+        'poolclass': MeteredQueuePool,
+        'pool_size': app.config['DB_POOL_SIZE'],
+        'max_overflow': app.config['DB_MAX_OVERFLOW'],
+        'pool_timeout': app.config['DB_POOL_TIMEOUT'],
+        'pool_recycle': app.config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': app.config['DB_POOL_PRE_PING']
+    }
+    if database_uri.startswith('postgresql'):
+        options['connect_args'] = {'connect_timeout': app.config['DB_CONNECT_TIMEOUT']}
+    return options
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
+def pool_stats():
+    """Pool configuration and usage of the default engine plus the process-wide counters."""
+    pool = db.engine.pool
+    stats = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'checked_out': pool.checkedout(),
+            'idle': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0)
+        })
+    stats.update(pool_metrics.stats())
+    return stats
+
+# SQL instrumentation
+def parameter_shape(parameters, executemany=False):
+    """Describe bound parameters by name and type without logging their values."""
+    if executemany:
+        return f"{len(parameters)} x {parameter_shape(parameters[0]) if parameters else '()'}"
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in parameters.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in parameters or ()) + ')'
+
+@db_event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+@db_event.listens_for(Engine, 'after_cursor_execute')
+def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started
+    if has_request_context():
+        g.sql_count = g.get('sql_count', 0) + 1
+        g.sql_time = g.get('sql_time', 0.0) + elapsed
+    if elapsed * 1000 >= app.config['SLOW_QUERY_MS']:
+        route = f"{request.method} {request.endpoint or request.path}" if has_request_context() else 'no request'
+        app.logger.warning(
+            'Slow query (%.1f ms) in %s: %s params=%s',
+            elapsed * 1000, route, ' '.join(statement.split())[:500], parameter_shape(parameters, executemany)
+        )
+
+def request_sql_stats():
+    """Statements run and seconds spent in the database so far in this request."""
+    return {'count': g.get('sql_count', 0), 'seconds': g.get('sql_time', 0.0)}
+
+@app.after_request
+def add_sql_timing_header(response):
+    if app.config['SQL_TIMING_HEADER']:
+        stats = request_sql_stats()
+        response.headers['Server-Timing'] = f'db;dur={stats["seconds"] * 1000:.1f};desc="{stats["count"]} queries"'
+    return response
+
+# Read replica routing
+READ_METHODS = ('GET', 'HEAD')
+
+_replicas = {'urls': (), 'engines': []}
+_replicas_lock = threading.Lock()
+
+def replica_engines():
+    """Engines for DATABASE_REPLICA_URLS, rebuilt when the setting changes."""
+    urls = tuple(app.config['DATABASE_REPLICA_URLS'])
+    with _replicas_lock:
+        if _replicas['urls'] != urls:
+            for engine in _replicas['engines']:
+                engine.dispose()
+            _replicas['engines'] = [db.create_engine(url, **engine_options(url)) for url in urls]
+            _replicas['urls'] = urls
+        return _replicas['engines']
+
+# Always read from the primary: a lagging replica would let a matrix compiled
+# from old grants be cached under the new permission version
+PRIMARY_READ_TABLES = frozenset({
+    'permission_version', 'permission_set', 'permission_set_permission', 'user_permission', 'user_permission_set'
+})
+
+def is_read_statement(clause):
+    if isinstance(clause, db_elements.TextClause):
+        return clause.text.lstrip().upper().startswith('SELECT')
+    return getattr(clause, 'is_select', False)
+
+def reads_primary_tables(clause):
+    """Whether a statement reads any table in PRIMARY_READ_TABLES."""
+    if isinstance(clause, db_elements.TextClause):
+        return False
+    return any(table.name in PRIMARY_READ_TABLES for table in db_sql_util.find_tables(clause, include_crud=True))
+
+def read_replica():
+    """The replica engine for the current request, or None if it must read from the primary."""
+    if not has_request_context() or request.method not in READ_METHODS:
+        return None
+    engines = replica_engines()
+    if not engines or flask_session.get('primary_until', 0) > time.time():
+        return None
+    if 'replica_engine' not in g:
+        g.replica_engine = random.choice(engines)
+    return g.replica_engine
+
+class RoutingSession(FlaskSession):
+    """Session that sends reads in GET requests to a replica and everything else to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and clause is not None and is_read_statement(clause):
+            if not self.info.get('primary_writes'):
+                engine = read_replica()
+                if engine is not None and not reads_primary_tables(clause):
+                    return engine
+        elif bind is None and replica_engines():
+            # Flushes, DML and explicit connections: keep the rest of the
+            # transaction on the primary and pin the user to it after commit
+            self.info['primary_writes'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@db_event.listens_for(RoutingSession, 'after_commit')
+def _pin_to_primary(session):
+    if session.info.pop('primary_writes', False) and has_request_context():
+        flask_session['primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+
+@db_event.listens_for(RoutingSession, 'after_rollback')
+def _discard_primary_writes(session):
+    session.info.pop('primary_writes', None)
+
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -57,7 +419,7 @@ class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(120), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(20), default='user')  # admin, manager, user
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -84,6 +446,10 @@ class PermissionSetPermission(db.Model):
     can_delete = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_permission_set_permission_lookup', 'permission_set_id', 'object_type', 'object_id'),
+    )
+
 # User Permissions Model
 class UserPermission(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -96,6 +462,10 @@ class UserPermission(db.Model):
     can_delete = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_user_permission_lookup', 'user_id', 'object_type', 'object_id'),
+    )
+
 # User Permission Set Assignment Model
 class UserPermissionSet(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -104,196 +474,2688 @@ class UserPermissionSet(db.Model):
     assigned_at = db.Column(db.DateTime, default=datetime.utcnow)
     assigned_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
-# Standard Objects
-class Contact(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    first_name = db.Column(db.String(50), nullable=False)
-    last_name = db.Column(db.String(50), nullable=False)
-    email = db.Column(db.String(120))
-    phone = db.Column(db.String(20))
-    company = db.Column(db.String(100))
-    title = db.Column(db.String(100))
-    address = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_user_permission_set_user', 'user_id', 'permission_set_id'),
+    )
+
+# Permission Version Model - single row bumped by every permission write
+class PermissionVersion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+# Standard Objects
+class Contact(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    first_name = db.Column(db.String(50), nullable=False)
+    last_name = db.Column(db.String(50), nullable=False)
+    email = db.Column(db.String(120))
+    phone = db.Column(db.String(20))
+    company = db.Column(db.String(100))
+    title = db.Column(db.String(100))
+    address = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_contact_created_at', 'created_at', 'id'),
+        db.Index('ix_contact_last_name', 'last_name', 'id'),
+        db.Index('ix_contact_first_name', 'first_name', 'id'),
+        db.Index('ix_contact_first_name_lower', db.func.lower(first_name)),
+        db.Index('ix_contact_last_name_lower', db.func.lower(last_name)),
+    )
+
+class Account(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    industry = db.Column(db.String(50))
+    website = db.Column(db.String(200))
+    phone = db.Column(db.String(20))
+    address = db.Column(db.Text)
+    annual_revenue = db.Column(db.Float)
+    employees = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_account_created_at', 'created_at', 'id'),
+        db.Index('ix_account_name', 'name', 'id'),
+        db.Index('ix_account_name_lower', db.func.lower(name)),
+    )
+
+class Opportunity(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), index=True)
+    contact_id = db.Column(db.Integer, db.ForeignKey('contact.id'), index=True)
+    amount = db.Column(db.Float)
+    stage = db.Column(db.String(50))
+    close_date = db.Column(db.Date)
+    probability = db.Column(db.Integer)
+    description = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    account = db.relationship('Account')
+    contact = db.relationship('Contact')
+
+    __table_args__ = (
+        db.Index('ix_opportunity_created_at', 'created_at', 'id'),
+        db.Index('ix_opportunity_name', 'name', 'id'),
+        db.Index('ix_opportunity_stage', 'stage', 'id'),
+        db.Index('ix_opportunity_close_date', 'close_date', 'id'),
+    )
+
+class Lead(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    first_name = db.Column(db.String(50), nullable=False)
+    last_name = db.Column(db.String(50), nullable=False)
+    email = db.Column(db.String(120))
+    phone = db.Column(db.String(20))
+    company = db.Column(db.String(100))
+    status = db.Column(db.String(50), default='New')
+    source = db.Column(db.String(50))
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_lead_created_at', 'created_at', 'id'),
+        db.Index('ix_lead_last_name', 'last_name', 'id'),
+        db.Index('ix_lead_first_name', 'first_name', 'id'),
+        db.Index('ix_lead_status', 'status', 'id'),
+    )
+
+# Custom Objects System
+class CustomObject(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    label = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text)
+    fields = db.Column(db.Text)  # JSON string of field definitions
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_custom_object_created_at', 'created_at', 'id'),
+    )
+
+class CustomRecord(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    object_id = db.Column(db.Integer, db.ForeignKey('custom_object.id'))
+    data = db.Column(db.Text)  # JSON string of field values
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    values = db.relationship('CustomRecordValue', cascade='all, delete-orphan', lazy='select')
+
+    __table_args__ = (
+        db.Index('ix_custom_record_object', 'object_id', 'created_at', 'id'),
+    )
+
+# Custom Record Value Model - typed, indexable copy of each non-empty field in CustomRecord.data
+class CustomRecordValue(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    record_id = db.Column(db.Integer, db.ForeignKey('custom_record.id'), nullable=False)
+    object_id = db.Column(db.Integer, db.ForeignKey('custom_object.id'), nullable=False)
+    field_name = db.Column(db.String(100), nullable=False)
+    value_text = db.Column(db.String(255))  # Raw value, truncated to the first 255 characters
+    value_number = db.Column(db.Float)  # Set for 'number' fields holding a valid number
+    value_date = db.Column(db.Date)  # Set for 'date' fields holding a valid YYYY-MM-DD date
+
+    __table_args__ = (
+        db.Index('ix_custom_record_value_record', 'record_id', 'field_name'),
+        db.Index('ix_custom_record_value_text', 'object_id', 'field_name', 'value_text', 'record_id'),
+        db.Index('ix_custom_record_value_number', 'object_id', 'field_name', 'value_number', 'record_id'),
+        db.Index('ix_custom_record_value_date', 'object_id', 'field_name', 'value_date', 'record_id'),
+    )
+
+# Record Counter Model - row counts maintained alongside every insert and delete
+class RecordCounter(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    object_type = db.Column(db.String(50), nullable=False)  # 'contact', 'account', 'opportunity', 'lead', 'custom_object', 'custom_record'
+    object_id = db.Column(db.Integer, nullable=False, default=0)  # custom_object.id for custom_record counts, 0 otherwise
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('object_type', 'object_id', name='uq_record_counter_key'),
+    )
+
+# Import Job Model - progress of one bulk import, updated in the same transaction as each batch
+class ImportJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    object_type = db.Column(db.String(50), nullable=False)  # 'contact', 'account', 'opportunity', 'lead'
+    filename = db.Column(db.String(255))
+    format = db.Column(db.String(10), nullable=False)  # 'csv' or 'ndjson'
+    status = db.Column(db.String(20), nullable=False, default='running')  # 'running', 'completed', 'failed'
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)  # input rows covered by committed batches
+    inserted = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    message = db.Column(db.Text)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Import Row Error Model - one rejected input row of an import job
+class ImportRowError(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('import_job.id'), nullable=False)
+    row_number = db.Column(db.Integer, nullable=False)
+    message = db.Column(db.Text, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_import_row_error_job', 'job_id', 'row_number'),
+    )
+
+# Search Document Model - searchable text of one standard record. The full-text
+# index over it (FTS5 on SQLite, a tsvector column with GIN on PostgreSQL) is
+# created by ensure_search_index().
+class SearchDocument(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    object_type = db.Column(db.String(50), nullable=False)  # 'contact', 'account', 'opportunity', 'lead'
+    object_id = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.Text, nullable=False, default='')  # Names, ranked above the body
+    body = db.Column(db.Text, nullable=False, default='')  # Emails, companies, notes, descriptions
+
+    __table_args__ = (
+        db.UniqueConstraint('object_type', 'object_id', name='uq_search_document_key'),
+    )
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU mapping with hit/miss/eviction counters."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            return self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+class TTLCache:
+    """Thread-safe mapping whose entries expire a fixed number of seconds after being set.
+
+    Entries are kept in the order they were set, so expired ones are dropped
+    from the front on every set; maxsize, if given, also evicts the oldest.
+    """
+
+    def __init__(self, ttl, maxsize=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self._data.pop(key, None)
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            now = time.monotonic()
+            self._data[key] = (now + self.ttl, value)
+            self._data.move_to_end(key)
+            while self._data and next(iter(self._data.values()))[0] <= now:
+                self._data.popitem(last=False)
+            while self.maxsize is not None and len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+# Model change tracking
+# Functions registered with on_models_committed() are called after every
+# successful commit with the set of model classes inserted, updated or deleted.
+_commit_listeners = []
+
+def on_models_committed(listener):
+    _commit_listeners.append(listener)
+    return listener
+
+@db.event.listens_for(db.orm.Session, 'after_flush')
+def _record_changed_models(session, flush_context):
+    changed = session.info.setdefault('changed_models', set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        changed.add(type(instance))
+
+@db.event.listens_for(db.orm.Session, 'after_commit')
+def _notify_commit_listeners(session):
+    changed = session.info.pop('changed_models', None)
+    if changed:
+        for listener in _commit_listeners:
+            listener(changed)
+
+@db.event.listens_for(db.orm.Session, 'after_rollback')
+def _discard_changed_models(session):
+    session.info.pop('changed_models', None)
+
+def model_snapshot(instance):
+    """Copy an instance's column values into a plain dict safe to share across requests."""
+    return {column.key: getattr(instance, column.key) for column in instance.__table__.columns}
+
+# Signed-in user loading
+# Column snapshots of recently seen users, so most requests skip the user lookup
+identity_cache = TTLCache(app.config['IDENTITY_CACHE_TTL'], app.config['IDENTITY_CACHE_SIZE'])
+
+class CachedUser(UserMixin):
+    """Read-only stand-in for User built from an identity cache snapshot."""
+
+    def __init__(self, values):
+        self._values = values
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    @property
+    def is_active(self):
+        return self._values['is_active']
+
+@login_manager.user_loader
+def load_user(user_id):
+    values = identity_cache.get(user_id)
+    if values is None:
+        user = db.session.get(User, int(user_id))
+        if user is None:
+            return None
+        values = model_snapshot(user)
+        del values['password_hash']
+        identity_cache.set(user_id, values)
+    # Deactivated users are signed out within IDENTITY_CACHE_TTL
+    if not values['is_active']:
+        return None
+    return CachedUser(values)
+
+@on_models_committed
+def invalidate_identities(changed_models):
+    if User in changed_models:
+        identity_cache.clear()
+
+# Permission helper functions
+PERMISSION_ACTIONS = ('view', 'create', 'edit', 'delete')
+
+class PermissionMatrix:
+    """Effective permissions of one user, keyed by (object_type, object_id).
+
+    Each entry holds the (view, create, edit, delete) flags of the grant that
+    wins for that key: a direct UserPermission first, otherwise the first
+    active permission set (in assignment order) that has a row for the key.
+    """
+
+    def __init__(self, grants):
+        self.grants = grants
+
+    def allows(self, object_type, object_id=None, permission='view'):
+        flags = self.grants.get((object_type, object_id))
+        if flags is None:
+            return False
+        if permission not in PERMISSION_ACTIONS:
+            permission = 'view'
+        return bool(flags[PERMISSION_ACTIONS.index(permission)])
+
+def permission_grants_query(user_id):
+    """Build the single query returning a user's grants in precedence order."""
+    direct = db.select(
+        db.literal(0).label('source'),
+        db.literal(0).label('assignment_order'),
+        UserPermission.id.label('row_order'),
+        UserPermission.object_type,
+        UserPermission.object_id,
+        UserPermission.can_view,
+        UserPermission.can_create,
+        UserPermission.can_edit,
+        UserPermission.can_delete
+    ).where(UserPermission.user_id == user_id)
+
+    from_sets = db.select(
+        db.literal(1).label('source'),
+        UserPermissionSet.id.label('assignment_order'),
+        PermissionSetPermission.id.label('row_order'),
+        PermissionSetPermission.object_type,
+        PermissionSetPermission.object_id,
+        PermissionSetPermission.can_view,
+        PermissionSetPermission.can_create,
+        PermissionSetPermission.can_edit,
+        PermissionSetPermission.can_delete
+    ).join(
+        PermissionSet, PermissionSet.id == UserPermissionSet.permission_set_id
+    ).join(
+        PermissionSetPermission, PermissionSetPermission.permission_set_id == PermissionSet.id
+    ).where(
+        UserPermissionSet.user_id == user_id,
+        PermissionSet.is_active == True  # noqa: E712
+    )
+
+    grants_query = db.union_all(direct, from_sets).subquery()
+    return db.select(grants_query).order_by(
+        grants_query.c.source,
+        grants_query.c.assignment_order,
+        grants_query.c.row_order
+    )
+
+def compile_permission_matrix(user_id):
+    """Load every direct and permission-set grant for a user in one query."""
+    rows = db.session.execute(permission_grants_query(user_id))
+
+    grants = {}
+    for row in rows:
+        # Rows arrive in precedence order, so the first one for a key wins
+        grants.setdefault(
+            (row.object_type, row.object_id),
+            (row.can_view, row.can_create, row.can_edit, row.can_delete)
+        )
+    return PermissionMatrix(grants)
+
+# Compiled matrices shared by every request in this worker, keyed by
+# (user_id, permission version) so a bumped version makes old entries unreachable
+permission_cache = LRUCache(app.config['PERMISSION_CACHE_SIZE'])
+
+def get_permission_version():
+    """Return the current permission version, read at most once per request."""
+    if has_request_context() and 'permission_version' in g:
+        return g.permission_version
+
+    version = db.session.execute(
+        db.select(PermissionVersion.version).where(PermissionVersion.id == 1)
+    ).scalar() or 0
+
+    if has_request_context():
+        g.permission_version = version
+    return version
+
+def bump_permission_version():
+    """Invalidate every cached permission matrix.
+
+    Call before committing any write to UserPermission, UserPermissionSet,
+    PermissionSet or PermissionSetPermission; the bump commits atomically
+    with that write, so every worker sees the new version on its next request.
+    """
+    updated = PermissionVersion.query.filter_by(id=1).update(
+        {PermissionVersion.version: PermissionVersion.version + 1}
+    )
+    if not updated:
+        db.session.add(PermissionVersion(id=1, version=1))
+
+    if has_request_context():
+        g.pop('permission_version', None)
+        g.pop('permission_matrices', None)
+
+def get_permission_matrix(user):
+    """Return the user's permission matrix from the request or worker cache."""
+    if not has_request_context():
+        return compile_permission_matrix(user.id)
+
+    matrices = g.setdefault('permission_matrices', {})
+    if user.id not in matrices:
+        key = (user.id, get_permission_version())
+        matrix = permission_cache.get(key)
+        if matrix is None:
+            matrix = compile_permission_matrix(user.id)
+            permission_cache.set(key, matrix)
+        matrices[user.id] = matrix
+    return matrices[user.id]
+
+def has_permission(user, object_type, object_id=None, permission='view'):
+    """Check if user has permission for a specific object type and permission level."""
+    if user.role == 'admin':
+        return True
+
+    return get_permission_matrix(user).allows(object_type, object_id, permission)
+
+def get_user_permissions(user):
+    """Get all permissions for a user."""
+    if user.role == 'admin':
+        return {
+            'contact': {'view': True, 'create': True, 'edit': True, 'delete': True},
+            'account': {'view': True, 'create': True, 'edit': True, 'delete': True},
+            'opportunity': {'view': True, 'create': True, 'edit': True, 'delete': True},
+            'lead': {'view': True, 'create': True, 'edit': True, 'delete': True},
+            'custom_object': {'view': True, 'create': True, 'edit': True, 'delete': True}
+        }
+    
+    permissions = {}
+    user_perms = UserPermission.query.filter_by(user_id=user.id).all()
+    
+    for perm in user_perms:
+        if perm.object_type not in permissions:
+            permissions[perm.object_type] = {}
+        
+        permissions[perm.object_type][perm.object_id] = {
+            'view': perm.can_view,
+            'create': perm.can_create,
+            'edit': perm.can_edit,
+            'delete': perm.can_delete
+        }
+    
+    return permissions
+
+# Keyset pagination helpers
+# Columns each list view may be sorted by. Only non-null columns are allowed:
+# a NULL sort value would fall outside every (column, id) range comparison.
+LIST_SORT_COLUMNS = {
+    'contact': ('created_at', 'last_name', 'first_name'),
+    'account': ('created_at', 'name'),
+    'opportunity': ('created_at', 'name'),
+    'lead': ('created_at', 'last_name', 'first_name')
+}
+
+class KeysetPage:
+    """One page of a keyset-paginated list view."""
+
+    def __init__(self, items, sort, direction, per_page, sort_options, next_cursor=None, prev_cursor=None,
+                 sort_labels=None, extra_args=None):
+        self.items = items
+        self.sort = sort
+        self.direction = direction
+        self.per_page = per_page
+        self.sort_options = sort_options
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.sort_labels = sort_labels or {}
+        self.extra_args = extra_args or {}  # Query args (such as filters) every page link must carry
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def url(self, cursor):
+        """URL of the current view at a cursor, keeping sort, size and extra args."""
+        return url_for(request.endpoint, **request.view_args, **self.extra_args,
+                       sort=self.sort, dir=self.direction, per_page=self.per_page, cursor=cursor)
+
+def encode_cursor(value, row_id, towards):
+    """Encode a (sort value, id) position and travel direction as a URL-safe token."""
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    payload = json.dumps({'v': value, 'id': row_id, 't': towards}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token, column):
+    """Decode a cursor token, coercing the sort value back to the column's type."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, row_id, towards = payload['v'], int(payload['id']), payload['t']
+    except (ValueError, KeyError, TypeError):
+        return None
+
+    if towards not in ('next', 'prev'):
+        return None
+
+    if value is not None:
+        python_type = column.type.python_type
+        try:
+            if python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif python_type is date:
+                value = date.fromisoformat(value)
+            else:
+                value = python_type(value)
+        except (ValueError, TypeError):
+            return None
+    return value, row_id, towards
+
+def keyset_paginate(query, sort_column, id_column, cursor=None, per_page=50, descending=False, sort_key=None):
+    """Return (items, next_cursor, prev_cursor) for one page of an ordered query.
+
+    Rows are ordered by (sort_column, id_column) and each page seeks past the
+    boundary row of the previous one, so every page costs one index range scan
+    no matter how deep it is.
+    """
+    if sort_key is None:
+        sort_key = lambda item: (getattr(item, sort_column.key), getattr(item, id_column.key))
+
+    position = db.tuple_(sort_column, id_column)
+    backwards = cursor is not None and cursor[2] == 'prev'
+
+    if cursor is not None:
+        boundary = db.tuple_(db.literal(cursor[0], sort_column.type), db.literal(cursor[1], id_column.type))
+        # Walking forward through a descending list is walking backward through the index
+        if descending != backwards:
+            query = query.filter(position < boundary)
+        else:
+            query = query.filter(position > boundary)
+
+    if descending != backwards:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    items = query.limit(per_page + 1).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+
+    if backwards:
+        items.reverse()
+
+    next_cursor = prev_cursor = None
+    if items:
+        first_key, last_key = sort_key(items[0]), sort_key(items[-1])
+        # A page reached through a "prev" cursor always has rows after it;
+        # a page reached through a "next" cursor always has rows before it
+        if has_more or backwards:
+            next_cursor = encode_cursor(last_key[0], last_key[1], 'next')
+        if (has_more and backwards) or (cursor is not None and not backwards):
+            prev_cursor = encode_cursor(first_key[0], first_key[1], 'prev')
+    return items, next_cursor, prev_cursor
+
+def list_page_args(sort_options, args):
+    """Read and validate the sort, dir and per_page args of a list view."""
+    sort = args.get('sort', 'created_at')
+    if sort not in sort_options:
+        sort = 'created_at'
+    direction = 'desc' if args.get('dir') == 'desc' else 'asc'
+
+    try:
+        per_page = int(args.get('per_page', app.config['LIST_PAGE_SIZE']))
+    except ValueError:
+        per_page = app.config['LIST_PAGE_SIZE']
+    per_page = max(1, min(per_page, app.config['LIST_MAX_PAGE_SIZE']))
+    return sort, direction, per_page
+
+def paginate_list(model, object_type, query=None, args=None):
+    """Paginate a standard object list view from the request's sort/dir/per_page/cursor args."""
+    if args is None:
+        args = request.args
+    sort_options = LIST_SORT_COLUMNS[object_type]
+    sort, direction, per_page = list_page_args(sort_options, args)
+
+    sort_column = getattr(model, sort)
+    cursor = None
+    if args.get('cursor'):
+        cursor = decode_cursor(args['cursor'], sort_column)
+
+    items, next_cursor, prev_cursor = keyset_paginate(
+        query if query is not None else model.query,
+        sort_column,
+        model.id,
+        cursor=cursor,
+        per_page=per_page,
+        descending=direction == 'desc'
+    )
+    return KeysetPage(items, sort, direction, per_page, sort_options, next_cursor, prev_cursor)
+
+# Custom object schemas
+# Parse a raw string value for a field type; raise ValueError when it is invalid
+CUSTOM_FIELD_COERCERS = {
+    'number': float,
+    'date': date.fromisoformat
+}
+
+# Extra checks for field types stored as text
+CUSTOM_FIELD_VALIDATORS = {
+    'email': lambda value: '@' in value
+}
+
+class CustomObjectSchema:
+    """Parsed field definitions of a CustomObject, built once per definition."""
+
+    def __init__(self, source):
+        fields = safe_json_load(source)
+        self.source = source
+        self.fields = [
+            field for field in fields
+            if isinstance(field, dict) and field.get('name')
+        ] if isinstance(fields, list) else []
+        self.fields_by_name = {field['name']: field for field in self.fields}
+
+    def coerce(self, name, raw):
+        """Return a field's raw value converted to its declared type."""
+        coercer = CUSTOM_FIELD_COERCERS.get(self.fields_by_name[name].get('type'))
+        return coercer(raw) if coercer else raw
+
+    def validate(self, data):
+        """Return a list of error messages for the non-empty values in data."""
+        errors = []
+        for field in self.fields:
+            raw = data.get(field['name'])
+            if raw is None or raw == '':
+                continue
+            label = field.get('label') or field['name']
+            try:
+                self.coerce(field['name'], raw)
+            except ValueError:
+                errors.append(f"{label} must be a valid {field.get('type')}")
+                continue
+            validator = CUSTOM_FIELD_VALIDATORS.get(field.get('type'))
+            if validator and not validator(raw):
+                errors.append(f"{label} must be a valid {field.get('type')}")
+        return errors
+
+    def build_values(self, object_id, data):
+        return build_custom_record_values(object_id, self.fields, data)
+
+# Compiled schemas keyed by object id. Each entry remembers the definition it
+# was built from, so a changed definition is rebuilt on its next use in every worker.
+custom_schema_cache = LRUCache(app.config['CUSTOM_SCHEMA_CACHE_SIZE'])
+
+def get_custom_schema(custom_object):
+    """Return the compiled schema for a CustomObject."""
+    schema = custom_schema_cache.get(custom_object.id)
+    if schema is None or schema.source != custom_object.fields:
+        schema = CustomObjectSchema(custom_object.fields)
+        custom_schema_cache.set(custom_object.id, schema)
+    return schema
+
+# Typed custom record storage
+CUSTOM_VALUE_TEXT_LENGTH = 255
+
+# Stored in a field's typed column when the record has no valid value for it,
+# so every record has a non-null sort key and missing values sort first
+CUSTOM_SORT_MISSING = {'number': float('-inf'), 'date': date.min}
+
+def custom_value_column_name(field_type):
+    if field_type == 'number':
+        return 'value_number'
+    if field_type == 'date':
+        return 'value_date'
+    return 'value_text'
+
+def coerce_custom_value(field_type, raw):
+    """Return (value_text, value_number, value_date) for one raw field value."""
+    if raw is None or raw == '':
+        return None
+    text = str(raw)
+    typed = {}
+    coercer = CUSTOM_FIELD_COERCERS.get(field_type)
+    if coercer:
+        try:
+            typed[field_type] = coercer(text)
+        except ValueError:
+            pass
+    return text[:CUSTOM_VALUE_TEXT_LENGTH], typed.get('number'), typed.get('date')
+
+def build_custom_record_values(object_id, fields, data):
+    """Build value rows for a record's data, one per declared field.
+
+    A field that is empty, or not a valid value of its type, gets the
+    CUSTOM_SORT_MISSING sentinel in its typed column instead of NULL.
+    """
+    values = []
+    for field in fields:
+        field_type = field.get('type')
+        value_text, value_number, value_date = coerce_custom_value(field_type, data.get(field.get('name'))) or ('', None, None)
+        value = {
+            'object_id': object_id,
+            'field_name': field['name'],
+            'value_text': value_text,
+            'value_number': value_number,
+            'value_date': value_date
+        }
+        column = custom_value_column_name(field_type)
+        if value[column] is None:
+            value[column] = CUSTOM_SORT_MISSING.get(field_type, '')
+        values.append(value)
+    return values
+
+@db.event.listens_for(db.orm.Session, 'before_flush')
+def _sync_custom_record_values(session, flush_context, instances):
+    for record in list(session.new) + list(session.dirty):
+        if not isinstance(record, CustomRecord):
+            continue
+        if record in session.dirty and not db.inspect(record).attrs.data.history.has_changes():
+            continue
+
+        custom_object = session.get(CustomObject, record.object_id) if record.object_id else None
+        if custom_object is None:
+            continue
+        schema = get_custom_schema(custom_object)
+        record.values = [
+            CustomRecordValue(**value)
+            for value in schema.build_values(record.object_id, safe_json_load(record.data))
+        ]
+
+def backfill_custom_record_values(batch_size=1000):
+    """Rebuild the typed value rows for every existing custom record.
+
+    Works through each custom object's records in primary key batches and
+    commits per batch, so it can be interrupted and re-run safely.
+    """
+    total = 0
+    for custom_object in CustomObject.query.order_by(CustomObject.id).all():
+        schema = get_custom_schema(custom_object)
+        last_id = 0
+        while True:
+            batch = db.session.execute(
+                db.select(CustomRecord.id, CustomRecord.data)
+                .where(CustomRecord.object_id == custom_object.id, CustomRecord.id > last_id)
+                .order_by(CustomRecord.id)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                break
+
+            record_ids = [row.id for row in batch]
+            db.session.execute(db.delete(CustomRecordValue).where(CustomRecordValue.record_id.in_(record_ids)))
+            rows = []
+            for row in batch:
+                for value in schema.build_values(custom_object.id, safe_json_load(row.data)):
+                    value['record_id'] = row.id
+                    rows.append(value)
+            if rows:
+                db.session.execute(db.insert(CustomRecordValue), rows)
+            db.session.commit()
+
+            total += len(batch)
+            last_id = record_ids[-1]
+    return total
+
+# Custom record filtering
+CUSTOM_RANGE_TYPES = ('number', 'date')
+
+def parse_custom_filter_value(field_type, raw):
+    """Parse a filter arg into the type stored for the field, or None if invalid."""
+    raw = (raw or '').strip()
+    if not raw:
+        return None
+    coercer = CUSTOM_FIELD_COERCERS.get(field_type)
+    if coercer:
+        try:
+            return coercer(raw)
+        except ValueError:
+            return None
+    return raw[:CUSTOM_VALUE_TEXT_LENGTH]
+
+def prefix_conditions(column, prefix):
+    """Index-friendly prefix match: a half-open range plus an exact startswith check."""
+    conditions = [column >= prefix, column.startswith(prefix, autoescape=True)]
+    if ord(prefix[-1]) < 0x10FFFF:
+        conditions.append(column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+    return conditions
+
+# Typeahead lookups
+# Each returns up to limit (id, label) matches for a lowercase search string,
+# using the lower() expression indexes on the searched columns.
+def typeahead_accounts(search, limit):
+    name = db.func.lower(Account.name)
+    rows = db.session.execute(
+        db.select(Account.id, Account.name)
+        .where(*prefix_conditions(name, search))
+        .order_by(name, Account.id)
+        .limit(limit)
+    )
+    return [(row.id, row.name) for row in rows]
+
+def typeahead_contacts(search, limit):
+    first_name, last_name = db.func.lower(Contact.first_name), db.func.lower(Contact.last_name)
+    words = search.split()
+    if len(words) > 1:
+        # "jane sm" matches first name "jane..." and last name "sm..."
+        condition = db.and_(*prefix_conditions(first_name, words[0]), *prefix_conditions(last_name, ' '.join(words[1:])))
+    else:
+        condition = db.or_(db.and_(*prefix_conditions(first_name, search)), db.and_(*prefix_conditions(last_name, search)))
+    rows = db.session.execute(
+        db.select(Contact.id, Contact.first_name, Contact.last_name, Contact.company)
+        .where(condition)
+        .order_by(last_name, first_name, Contact.id)
+        .limit(limit)
+    )
+    return [
+        (row.id, f"{row.first_name} {row.last_name}" + (f" ({row.company})" if row.company else ''))
+        for row in rows
+    ]
+
+TYPEAHEAD_SOURCES = {
+    'account': typeahead_accounts,
+    'contact': typeahead_contacts
+}
+
+def apply_custom_record_filters(query, object_id, fields, args):
+    """Push f.<field>, f.<field>.min and f.<field>.max args down into SQL.
+
+    f.<field> is an equality match for number and date fields and a prefix
+    match for every other type; .min and .max are inclusive range bounds for
+    number and date fields. Each filtered field joins its typed value rows, so
+    the database can drive the query from the value indexes.
+    Returns the filtered query and the args that were applied.
+    """
+    applied = {}
+    for field in fields:
+        name, field_type = field['name'], field.get('type')
+        alias = db.aliased(CustomRecordValue)
+        column = getattr(alias, custom_value_column_name(field_type))
+        conditions = []
+
+        value = parse_custom_filter_value(field_type, args.get(f'f.{name}'))
+        if value is not None:
+            if field_type in CUSTOM_RANGE_TYPES:
+                conditions.append(column == value)
+            else:
+                conditions.extend(prefix_conditions(column, value))
+            applied[f'f.{name}'] = args[f'f.{name}'].strip()
+
+        if field_type in CUSTOM_RANGE_TYPES:
+            for bound in ('min', 'max'):
+                key = f'f.{name}.{bound}'
+                value = parse_custom_filter_value(field_type, args.get(key))
+                if value is not None:
+                    conditions.append(column >= value if bound == 'min' else column <= value)
+                    applied[key] = args[key].strip()
+
+        if conditions:
+            if field_type in CUSTOM_RANGE_TYPES:
+                # Skip records holding the missing-value sentinel
+                conditions.append(column > CUSTOM_SORT_MISSING[field_type])
+            query = query.join(alias, db.and_(
+                alias.record_id == CustomRecord.id,
+                alias.object_id == object_id,
+                alias.field_name == name,
+                *conditions
+            ))
+    return query, applied
+
+def paginate_custom_records(custom_object_id, fields, args):
+    """Filter, sort and keyset-paginate one custom object's records."""
+    fields_by_name = {field['name']: field for field in fields}
+    sort_options = ('created_at',) + tuple(fields_by_name)
+    sort_labels = {name: field.get('label') or name for name, field in fields_by_name.items()}
+    sort, direction, per_page = list_page_args(sort_options, args)
+
+    query = CustomRecord.query.filter(CustomRecord.object_id == custom_object_id)
+    query, applied = apply_custom_record_filters(query, custom_object_id, fields, args)
+
+    if sort == 'created_at':
+        sort_column, id_column = CustomRecord.created_at, CustomRecord.id
+        sort_key = None
+    else:
+        # Every record has a value row per field, so an inner join ordered by
+        # (value, record_id) walks the typed value index directly
+        field_type = fields_by_name[sort].get('type')
+        alias = db.aliased(CustomRecordValue)
+        sort_column, id_column = getattr(alias, custom_value_column_name(field_type)), alias.record_id
+        query = query.join(alias, db.and_(
+            alias.record_id == CustomRecord.id,
+            alias.object_id == custom_object_id,
+            alias.field_name == sort
+        )).add_columns(sort_column.label('sort_value'))
+        sort_key = lambda row: (row.sort_value, row[0].id)
+
+    cursor = None
+    if args.get('cursor'):
+        cursor = decode_cursor(args['cursor'], sort_column)
+
+    items, next_cursor, prev_cursor = keyset_paginate(
+        query, sort_column, id_column,
+        cursor=cursor, per_page=per_page, descending=direction == 'desc', sort_key=sort_key
+    )
+    if sort_key is not None:
+        items = [row[0] for row in items]
+    return KeysetPage(items, sort, direction, per_page, sort_options, next_cursor, prev_cursor,
+                      sort_labels=sort_labels, extra_args=applied)
+
+@app.cli.command('backfill-custom-values')
+def backfill_custom_values_command():
+    """Rebuild typed, indexable values for all existing custom records."""
+    total = backfill_custom_record_values()
+    print(f"✅ Backfilled typed values for {total} custom records")
+
+# Record counters
+COUNTED_MODELS = {
+    Contact: 'contact',
+    Account: 'account',
+    Opportunity: 'opportunity',
+    Lead: 'lead',
+    CustomObject: 'custom_object'
+}
+
+def counter_key(instance):
+    """Return the (object_type, object_id) counter an instance is counted under, if any."""
+    if isinstance(instance, CustomRecord):
+        return ('custom_record', instance.object_id or 0)
+    object_type = COUNTED_MODELS.get(type(instance))
+    return (object_type, 0) if object_type else None
+
+def count_rows(connection, object_type, object_id):
+    """Count the rows behind one counter from scratch."""
+    if object_type == 'custom_record':
+        query = db.select(db.func.count()).select_from(CustomRecord).where(CustomRecord.object_id == object_id)
+    else:
+        model = next(model for model, name in COUNTED_MODELS.items() if name == object_type)
+        query = db.select(db.func.count()).select_from(model)
+    return connection.execute(query).scalar()
+
+# Dialects whose INSERT supports ON CONFLICT DO NOTHING
+UPSERT_INSERTS = {'postgresql': postgresql_insert, 'sqlite': sqlite_insert}
+
+def adjust_counter(connection, object_type, object_id, delta):
+    """Apply a delta to a counter inside the caller's transaction.
+
+    Rows written outside the ORM (bulk inserts) must call this themselves;
+    ORM inserts and deletes are counted automatically on flush.
+    """
+    update = (
+        db.update(RecordCounter)
+        .where(RecordCounter.object_type == object_type, RecordCounter.object_id == object_id)
+        .values(count=RecordCounter.count + delta)
+    )
+    if connection.execute(update).rowcount:
+        return
+
+    # First write for this counter: seed it from the table, which already
+    # includes the rows flushed in this transaction
+    insert = UPSERT_INSERTS.get(connection.dialect.name)
+    statement = (insert or db.insert)(RecordCounter).values(
+        object_type=object_type,
+        object_id=object_id,
+        count=count_rows(connection, object_type, object_id)
+    )
+    if insert is not None:
+        statement = statement.on_conflict_do_nothing(index_elements=['object_type', 'object_id'])
+    if not connection.execute(statement).rowcount:
+        # A concurrent transaction seeded it first, without our rows: add them on top
+        connection.execute(update)
+
+@db.event.listens_for(db.orm.Session, 'after_flush')
+def _maintain_record_counters(session, flush_context):
+    deltas = {}
+    for instances, sign in ((session.new, 1), (session.deleted, -1)):
+        for instance in instances:
+            key = counter_key(instance)
+            if key:
+                deltas[key] = deltas.get(key, 0) + sign
+
+    if deltas:
+        connection = session.connection()
+        for (object_type, object_id), delta in sorted(deltas.items()):
+            if delta:
+                adjust_counter(connection, object_type, object_id, delta)
+
+def reconcile_counters():
+    """Recompute every counter from the underlying tables."""
+    connection = db.session.connection()
+    if db.engine.dialect.name == 'postgresql':
+        # Writers block on their counter update until we commit, then apply
+        # their delta on top of the recomputed value
+        connection.execute(db.text('LOCK TABLE record_counter IN EXCLUSIVE MODE'))
+
+    counts = {(name, 0): count for name, count in aggregate_counts().items()}
+    per_object = connection.execute(
+        db.select(CustomObject.id, db.func.count(CustomRecord.id))
+        .outerjoin(CustomRecord, CustomRecord.object_id == CustomObject.id)
+        .group_by(CustomObject.id)
+    )
+    for object_id, count in per_object:
+        counts[('custom_record', object_id)] = count
+
+    existing = {(counter.object_type, counter.object_id): counter for counter in RecordCounter.query.all()}
+    for key, counter in existing.items():
+        if key not in counts:
+            db.session.delete(counter)
+    for (object_type, object_id), count in counts.items():
+        counter = existing.get((object_type, object_id))
+        if counter is None:
+            db.session.add(RecordCounter(object_type=object_type, object_id=object_id, count=count))
+        else:
+            counter.count = count
+    db.session.commit()
+    return counts
+
+@app.cli.command('reconcile-counters')
+def reconcile_counters_command():
+    """Recompute the dashboard record counters from scratch."""
+    counts = reconcile_counters()
+    for (object_type, object_id), count in sorted(counts.items()):
+        label = f"{object_type} #{object_id}" if object_type == 'custom_record' else object_type
+        print(f"✅ {label}: {count}")
+
+# Full-text search
+SEARCH_MODELS = {
+    'contact': Contact,
+    'account': Account,
+    'opportunity': Opportunity,
+    'lead': Lead
+}
+
+SEARCH_OBJECT_TYPES = {model: object_type for object_type, model in SEARCH_MODELS.items()}
+
+# (title columns, body columns) copied into each object's search document
+SEARCH_FIELDS = {
+    'contact': (('first_name', 'last_name'), ('email', 'phone', 'company', 'title')),
+    'account': (('name',), ('industry', 'website', 'phone')),
+    'opportunity': (('name',), ('stage', 'description')),
+    'lead': (('first_name', 'last_name'), ('email', 'phone', 'company', 'source', 'notes'))
+}
+
+# Edit page each search hit links to
+SEARCH_ENDPOINTS = {
+    'contact': 'edit_contact',
+    'account': 'edit_account',
+    'opportunity': 'edit_opportunity',
+    'lead': 'edit_lead'
+}
+
+SQLITE_SEARCH_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_document_fts USING fts5(
+        title, body, content='search_document', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS search_document_ai AFTER INSERT ON search_document BEGIN
+        INSERT INTO search_document_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_document_ad AFTER DELETE ON search_document BEGIN
+        INSERT INTO search_document_fts(search_document_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_document_au AFTER UPDATE ON search_document BEGIN
+        INSERT INTO search_document_fts(search_document_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO search_document_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END"""
+)
+
+# Punctuation is folded to spaces so "jane.doe@example.com" indexes as the same
+# words search_terms() produces from a query
+POSTGRESQL_SEARCH_DDL = (
+    """ALTER TABLE search_document ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', regexp_replace(title, '[^[:alnum:]_]+', ' ', 'g')), 'A') ||
+        setweight(to_tsvector('simple', regexp_replace(body, '[^[:alnum:]_]+', ' ', 'g')), 'B')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_search_document_vector ON search_document USING GIN (search_vector)"
+)
+
+def ensure_search_index():
+    """Create the full-text index over search_document for the current database.
+
+    Safe to run repeatedly. On SQLite the FTS5 table is rebuilt from
+    search_document whenever its triggers had to be (re)created.
+    """
+    with db.engine.begin() as connection:
+        if connection.dialect.name == 'sqlite':
+            installed = connection.execute(db.text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'search_document_ai'"
+            )).first()
+            for statement in SQLITE_SEARCH_DDL:
+                connection.execute(db.text(statement))
+            if not installed:
+                connection.execute(db.text("INSERT INTO search_document_fts(search_document_fts) VALUES ('rebuild')"))
+        elif connection.dialect.name == 'postgresql':
+            for statement in POSTGRESQL_SEARCH_DDL:
+                connection.execute(db.text(statement))
+
+def search_document_values(object_type, record):
+    """Return the title and body text of a record's search document."""
+    title_fields, body_fields = SEARCH_FIELDS[object_type]
+    text = lambda names: ' '.join(str(value) for value in (getattr(record, name) for name in names) if value)
+    return {'title': text(title_fields), 'body': text(body_fields)}
+
+def index_search_rows(connection, object_type, condition=None, batch_size=1000):
+    """Insert search documents for rows that have none yet, walking the table in id order.
+
+    Used by the rebuild command and for rows inserted outside the ORM.
+    """
+    model = SEARCH_MODELS[object_type]
+    columns = [model.id] + [getattr(model, name) for names in SEARCH_FIELDS[object_type] for name in names]
+    last_id, total = 0, 0
+    while True:
+        query = db.select(*columns).where(model.id > last_id).order_by(model.id).limit(batch_size)
+        if condition is not None:
+            query = query.where(condition)
+        rows = connection.execute(query).all()
+        if not rows:
+            return total
+        connection.execute(db.insert(SearchDocument), [
+            dict(search_document_values(object_type, row), object_type=object_type, object_id=row.id)
+            for row in rows
+        ])
+        last_id = rows[-1].id
+        total += len(rows)
+
+@db.event.listens_for(db.orm.Session, 'after_flush')
+def _maintain_search_documents(session, flush_context):
+    changed, deleted = [], []
+    for instance in session.new:
+        if type(instance) in SEARCH_OBJECT_TYPES:
+            changed.append(instance)
+    for instance in session.dirty:
+        object_type = SEARCH_OBJECT_TYPES.get(type(instance))
+        if object_type:
+            state = db.inspect(instance)
+            if any(state.attrs[name].history.has_changes() for names in SEARCH_FIELDS[object_type] for name in names):
+                changed.append(instance)
+    for instance in session.deleted:
+        if type(instance) in SEARCH_OBJECT_TYPES:
+            deleted.append(instance)
+    if not changed and not deleted:
+        return
+
+    connection = session.connection()
+    for instance in deleted:
+        connection.execute(db.delete(SearchDocument).where(
+            SearchDocument.object_type == SEARCH_OBJECT_TYPES[type(instance)],
+            SearchDocument.object_id == instance.id
+        ))
+    for instance in changed:
+        object_type = SEARCH_OBJECT_TYPES[type(instance)]
+        values = search_document_values(object_type, instance)
+        updated = connection.execute(
+            db.update(SearchDocument)
+            .where(SearchDocument.object_type == object_type, SearchDocument.object_id == instance.id)
+            .values(**values)
+        ).rowcount
+        if not updated:
+            connection.execute(db.insert(SearchDocument).values(object_type=object_type, object_id=instance.id, **values))
+
+def rebuild_search_index():
+    """Recreate every search document from the standard object tables."""
+    ensure_search_index()
+    connection = db.session.connection()
+    connection.execute(db.delete(SearchDocument))
+    counts = {object_type: index_search_rows(connection, object_type) for object_type in SEARCH_MODELS}
+    db.session.commit()
+    return counts
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Rebuild the full-text search index from scratch."""
+    for object_type, count in rebuild_search_index().items():
+        print(f"✅ Indexed {count} {object_type} records")
+
+def search_terms(query):
+    """Split a search query into at most ten lowercase words."""
+    return re.findall(r'\w+', query.lower())[:10]
+
+def search_documents(query, object_types, page=1, per_page=20):
+    """Return (hits, has_next) for one page of ranked search results.
+
+    Every word must match the start of a word in the document. Hits are
+    SearchDocument rows (object_type, object_id, title, body) ordered best first.
+    """
+    terms = search_terms(query)
+    if not terms or not object_types:
+        return [], False
+
+    params = {'types': list(object_types), 'limit': per_page + 1, 'offset': (page - 1) * per_page}
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        statement = db.text("""
+            SELECT d.object_type, d.object_id, d.title, d.body
+            FROM search_document_fts JOIN search_document d ON d.id = search_document_fts.rowid
+            WHERE search_document_fts MATCH :match AND d.object_type IN :types
+            ORDER BY bm25(search_document_fts, 10.0, 1.0), d.id
+            LIMIT :limit OFFSET :offset
+        """).bindparams(db.bindparam('types', expanding=True))
+        params['match'] = ' '.join(f'"{term}"*' for term in terms)
+    elif dialect == 'postgresql':
+        statement = db.text("""
+            SELECT object_type, object_id, title, body
+            FROM search_document, to_tsquery('simple', :tsquery) AS query
+            WHERE search_vector @@ query AND object_type IN :types
+            ORDER BY ts_rank(search_vector, query) DESC, id
+            LIMIT :limit OFFSET :offset
+        """).bindparams(db.bindparam('types', expanding=True))
+        params['tsquery'] = ' & '.join(f'{term}:*' for term in terms)
+    else:
+        # No full-text index on this database: unranked substring match
+        text = SearchDocument.title + ' ' + SearchDocument.body
+        statement = (
+            db.select(SearchDocument.object_type, SearchDocument.object_id, SearchDocument.title, SearchDocument.body)
+            .where(SearchDocument.object_type.in_(db.bindparam('types', expanding=True)),
+                   *[text.ilike(f'%{term}%') for term in terms])
+            .order_by(SearchDocument.id)
+            .limit(db.bindparam('limit')).offset(db.bindparam('offset'))
+        )
+
+    hits = db.session.execute(statement, params).all()
+    return hits[:per_page], len(hits) > per_page
+
+# Autocomplete prefix index
+AUTOCOMPLETE_MODELS = {
+    'contact': Contact,
+    'lead': Lead
+}
+
+AUTOCOMPLETE_OBJECT_TYPES = {model: object_type for object_type, model in AUTOCOMPLETE_MODELS.items()}
+
+AUTOCOMPLETE_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'company')
+
+# Index entries always examined per lookup before ranking. Past this, the scan
+# stops as soon as it has enough matches, so very common prefixes stay cheap
+# without ever dropping matches that exist.
+AUTOCOMPLETE_SCAN_LIMIT = 500
+
+def autocomplete_entry(object_type, record):
+    """Return (object_type, id, label, detail, tokens) for a contact or lead.
+
+    Tokens are the lowercase name words, the lowercase email and the phone
+    digits (also without a country code, and the local seven digits).
+    """
+    label = f"{record.first_name or ''} {record.last_name or ''}".strip()
+    tokens = set(label.lower().split())
+    if record.email:
+        tokens.add(record.email.strip().lower())
+    digits = re.sub(r'\D', '', record.phone or '')
+    if digits:
+        tokens.update(digits[-length:] for length in (len(digits), 10, 7) if len(digits) >= length)
+    detail = record.email or record.phone or record.company or ''
+    return (object_type, record.id, label, detail, tuple(sorted(tokens)))
+
+def autocomplete_terms(query):
+    """Normalize a query the same way entries are tokenized."""
+    query = query.strip().lower()
+    if re.fullmatch(r'[\d\s()+.-]+', query):
+        digits = re.sub(r'\D', '', query)
+        return [digits] if digits else []
+    return query.split()
+
+class PrefixIndex:
+    """In-memory prefix index over contact and lead names, emails and phones.
+
+    Tokens live in one sorted list with a parallel list of record keys, so a
+    lookup is a binary search plus a short scan and an update is an insort.
+    Each worker process keeps its own copy.
+    """
+
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self.loaded_at = None
+        self.stale = False
+        self.refreshing = False
+        self._lock = threading.RLock()
+        self._tokens = []
+        self._keys = []
+        self._entries = {}  # (object_type, id) -> entry
+        self._pending = None  # Changes committed while a load is running
+
+    def load(self, entries):
+        """Replace the index contents with freshly read entries."""
+        with self._lock:
+            self._pending = {}
+
+        loaded = {}
+        pairs = []
+        for entry in entries:
+            key = (entry[0], entry[1])
+            loaded[key] = entry
+            pairs.extend((token, key) for token in entry[4])
+        pairs.sort()
+
+        with self._lock:
+            self._tokens = [token for token, _ in pairs]
+            self._keys = [key for _, key in pairs]
+            self._entries = loaded
+            pending, self._pending = self._pending, None
+            for key, entry in pending.items():
+                self._apply(key, entry)
+            self.loaded_at = time.monotonic()
+            self.stale = False
+        del pairs
+        # The first full collection after a load walks every new tuple once;
+        # pay for it here rather than in the next lookup
+        gc.collect()
+
+    def apply(self, changes):
+        """Apply committed changes, a dict of key -> entry (None for a delete)."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.update(changes)
+            if self.loaded_at is not None:
+                for key, entry in changes.items():
+                    self._apply(key, entry)
+
+    def _apply(self, key, entry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            for token in old[4]:
+                position = bisect.bisect_left(self._tokens, token)
+                while position < len(self._tokens) and self._tokens[position] == token:
+                    if self._keys[position] == key:
+                        del self._tokens[position]
+                        del self._keys[position]
+                        break
+                    position += 1
+        if entry is not None:
+            self._entries[key] = entry
+            for token in entry[4]:
+                position = bisect.bisect_right(self._tokens, token)
+                self._tokens.insert(position, token)
+                self._keys.insert(position, key)
+
+    def needs_refresh(self):
+        return self.stale or (self.loaded_at is not None and time.monotonic() - self.loaded_at > self.max_age)
+
+    def search(self, query, object_types, limit=10):
+        """Return up to limit entries whose tokens start with every query word.
+
+        Entries with a token equal to a query word come first, then by label.
+        """
+        terms = autocomplete_terms(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            # Walk the narrowest token range: the query word with the fewest index tokens
+            ranges = [(bisect.bisect_left(self._tokens, term), bisect.bisect_left(self._tokens, term + '\uffff'), term)
+                      for term in terms]
+            start, end, driver = min(ranges, key=lambda bounds: bounds[1] - bounds[0])
+            rest = [term for term in terms if term != driver]
+
+            matches = {}
+            for position in range(start, end):
+                if len(matches) >= limit and position - start >= AUTOCOMPLETE_SCAN_LIMIT:
+                    break
+                key = self._keys[position]
+                if key in matches or key[0] not in object_types:
+                    continue
+                entry = self._entries[key]
+                if all(any(token.startswith(term) for token in entry[4]) for term in rest):
+                    matches[key] = entry
+            entries = list(matches.values())
+
+        results = [
+            (not any(term in entry[4] for term in terms), entry[2].lower(), entry[1], entry) for entry in entries
+        ]
+        results.sort(key=lambda result: result[:3])
+        return [result[3] for result in results[:limit]]
+
+    def memory_report(self, budget_bytes=None):
+        """Estimate the bytes held by the index and compare them to a budget."""
+        with self._lock:
+            size = sys.getsizeof(self._tokens) + sys.getsizeof(self._keys) + sys.getsizeof(self._entries)
+            for key, entry in self._entries.items():
+                # Token strings and keys are shared between the entries and the sorted lists
+                size += sys.getsizeof(key) + sys.getsizeof(key[0]) + sys.getsizeof(entry)
+                size += sys.getsizeof(entry[2]) + sys.getsizeof(entry[3]) + sys.getsizeof(entry[4])
+                size += sum(sys.getsizeof(token) for token in entry[4])
+            report = {
+                'loaded': self.loaded_at is not None,
+                'records': len(self._entries),
+                'tokens': len(self._tokens),
+                'bytes': size,
+                'bytes_per_record': size // len(self._entries) if self._entries else 0
+            }
+        if budget_bytes is not None:
+            report['budget_bytes'] = int(budget_bytes)
+            report['within_budget'] = size <= budget_bytes
+        return report
+
+autocomplete_index = PrefixIndex(app.config['AUTOCOMPLETE_MAX_AGE'])
+_autocomplete_load_lock = threading.Lock()
+
+def autocomplete_entries():
+    """Read every contact and lead as an index entry."""
+    for object_type, model in AUTOCOMPLETE_MODELS.items():
+        columns = [model.id] + [getattr(model, name) for name in AUTOCOMPLETE_FIELDS]
+        for row in stream_rows(db.select(*columns)):
+            yield autocomplete_entry(object_type, row)
+
+def _refresh_autocomplete_index():
+    try:
+        with app.app_context():
+            autocomplete_index.load(autocomplete_entries())
+    finally:
+        autocomplete_index.refreshing = False
+
+def get_autocomplete_index():
+    """Return the autocomplete index, loading it on first use.
+
+    An index older than AUTOCOMPLETE_MAX_AGE (or marked stale) keeps serving
+    while a background thread reloads it.
+    """
+    if autocomplete_index.loaded_at is None:
+        with _autocomplete_load_lock:
+            if autocomplete_index.loaded_at is None:
+                autocomplete_index.load(autocomplete_entries())
+    elif autocomplete_index.needs_refresh() and not autocomplete_index.refreshing:
+        with _autocomplete_load_lock:
+            if not autocomplete_index.refreshing:
+                autocomplete_index.refreshing = True
+                threading.Thread(target=_refresh_autocomplete_index, daemon=True).start()
+    return autocomplete_index
+
+@db.event.listens_for(db.orm.Session, 'after_flush')
+def _record_autocomplete_changes(session, flush_context):
+    changes = session.info.setdefault('autocomplete_changes', {})
+    for instance in list(session.new) + list(session.dirty):
+        object_type = AUTOCOMPLETE_OBJECT_TYPES.get(type(instance))
+        if object_type and (instance in session.new or any(
+            db.inspect(instance).attrs[name].history.has_changes() for name in AUTOCOMPLETE_FIELDS
+        )):
+            changes[(object_type, instance.id)] = autocomplete_entry(object_type, instance)
+    for instance in session.deleted:
+        object_type = AUTOCOMPLETE_OBJECT_TYPES.get(type(instance))
+        if object_type:
+            changes[(object_type, instance.id)] = None
+
+@db.event.listens_for(db.orm.Session, 'after_commit')
+def _apply_autocomplete_changes(session):
+    changes = session.info.pop('autocomplete_changes', None)
+    if changes:
+        autocomplete_index.apply(changes)
+
+@db.event.listens_for(db.orm.Session, 'after_rollback')
+def _discard_autocomplete_changes(session):
+    session.info.pop('autocomplete_changes', None)
+
+@app.cli.command('autocomplete-report')
+def autocomplete_report_command():
+    """Load the autocomplete index and report its memory use against the budget."""
+    started = time.perf_counter()
+    index = get_autocomplete_index()
+    elapsed = (time.perf_counter() - started) * 1000
+    report = index.memory_report(app.config['AUTOCOMPLETE_MEMORY_BUDGET_MB'] * 1024 * 1024)
+    print(f"📊 Loaded {report['records']} records ({report['tokens']} tokens) in {elapsed:.0f} ms")
+    print(f"📊 Estimated memory: {report['bytes'] / 1024 / 1024:.1f} MB ({report['bytes_per_record']} bytes per record)")
+    if report['within_budget']:
+        print(f"✅ Within the {app.config['AUTOCOMPLETE_MEMORY_BUDGET_MB']:g} MB budget")
+    else:
+        print(f"⚠️  Over the {app.config['AUTOCOMPLETE_MEMORY_BUDGET_MB']:g} MB budget; raise AUTOCOMPLETE_MEMORY_BUDGET_MB or disable autocomplete")
+
+# Bulk import
+IMPORT_MODELS = {
+    'contact': Contact,
+    'account': Account,
+    'opportunity': Opportunity,
+    'lead': Lead
+}
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+def import_format_for(filename):
+    """Guess an import format from a file name."""
+    return 'ndjson' if filename and filename.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+def import_columns(model):
+    """Return the columns an import may set, keyed by name."""
+    return {column.key: column for column in model.__table__.columns if not column.primary_key}
+
+def coerce_import_value(column, raw):
+    """Convert one raw import value to a column's Python type; raise ValueError when invalid."""
+    if isinstance(raw, str):
+        raw = raw.strip()
+    if raw is None or raw == '':
+        return None
+
+    python_type = column.type.python_type
+    if python_type is str:
+        value = str(raw)
+        if column.type.length and len(value) > column.type.length:
+            raise ValueError(f"{column.key} is longer than {column.type.length} characters")
+        return value
+    try:
+        if python_type is int:
+            if isinstance(raw, bool) or (isinstance(raw, float) and not raw.is_integer()):
+                raise ValueError
+            return int(raw)
+        if python_type is float:
+            if isinstance(raw, bool):
+                raise ValueError
+            return float(raw)
+        if python_type is datetime:
+            return datetime.fromisoformat(str(raw))
+        if python_type is date:
+            return date.fromisoformat(str(raw))
+    except (TypeError, ValueError):
+        raise ValueError(f"{column.key} must be a valid {python_type.__name__}")
+    return raw
+
+def coerce_import_row(columns, record):
+    """Return (values, errors) for one input record.
+
+    Values always carry every import column so a batch can be inserted as one
+    multi-row statement; missing values fall back to the column default.
+    """
+    errors = [f"unknown column {key}" for key in record if key not in columns]
+    values = {}
+    for name, column in columns.items():
+        try:
+            value = coerce_import_value(column, record.get(name))
+        except ValueError as e:
+            errors.append(str(e))
+            continue
+        if value is None and column.default is not None:
+            value = column.default.arg(None) if column.default.is_callable else column.default.arg
+        if value is None and not column.nullable:
+            errors.append(f"{name} is required")
+        values[name] = value
+    return values, errors
+
+def read_import_rows(stream, format, columns):
+    """Yield (row_number, record, error) for each input row of an open text stream."""
+    if format == 'ndjson':
+        row_number = 0
+        for line in stream:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield row_number, None, 'invalid JSON'
+                continue
+            if isinstance(record, dict):
+                yield row_number, record, None
+            else:
+                yield row_number, None, 'expected a JSON object'
+        return
+
+    reader = csv.DictReader(stream)
+    unknown = [name for name in reader.fieldnames or [] if name not in columns]
+    if unknown:
+        raise ValueError(f"Unknown columns in header: {', '.join(unknown)}")
+    for row_number, record in enumerate(reader, start=1):
+        if None in record:
+            yield row_number, None, 'too many values'
+        else:
+            yield row_number, record, None
+
+def missing_references(columns, rows):
+    """Return the indexes of rows whose foreign keys point at rows that do not exist."""
+    missing = {}
+    for name, column in columns.items():
+        for foreign_key in column.foreign_keys:
+            ids = {row[name] for row in rows if row.get(name) is not None}
+            if not ids:
+                continue
+            existing = set(db.session.execute(
+                db.select(foreign_key.column).where(foreign_key.column.in_(ids))
+            ).scalars())
+            for index, row in enumerate(rows):
+                if row.get(name) is not None and row[name] not in existing:
+                    missing.setdefault(index, []).append(f"{name} {row[name]} does not exist")
+    return missing
+
+def insert_import_rows(connection, model, rows):
+    """Insert a batch of rows with one statement and return their ids.
+
+    Uses COPY on PostgreSQL, with ids drawn from the table's sequence up
+    front, and a bulk INSERT ... RETURNING elsewhere.
+    """
+    if connection.dialect.name != 'postgresql':
+        return connection.execute(
+            db.insert(model).returning(model.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+
+    ids = connection.execute(
+        db.text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)"),
+        {'table': model.__table__.name, 'count': len(rows)}
+    ).scalars().all()
+    rows = [dict(row, id=row_id) for row, row_id in zip(rows, ids)]
+
+    quote = connection.dialect.identifier_preparer.quote
+    names = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # An unquoted empty field is NULL in COPY's CSV format; empty strings never reach here
+        writer.writerow([
+            '' if row[name] is None else row[name].isoformat() if isinstance(row[name], date) else row[name]
+            for name in names
+        ])
+    buffer.seek(0)
+
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {quote(model.__table__.name)} ({', '.join(quote(name) for name in names)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
+    return ids
+
+def import_batch(job, model, columns, batch):
+    """Validate and insert one batch, committing it together with the job's progress."""
+    valid, errors = [], []
+    for row_number, record, error in batch:
+        if error:
+            errors.append((row_number, [error]))
+            continue
+        values, row_errors = coerce_import_row(columns, record)
+        if row_errors:
+            errors.append((row_number, row_errors))
+        else:
+            valid.append((row_number, values))
+
+    missing = missing_references(columns, [values for _, values in valid])
+    rows = []
+    for index, (row_number, values) in enumerate(valid):
+        if index in missing:
+            errors.append((row_number, missing[index]))
+        else:
+            rows.append(values)
+
+    connection = db.session.connection()
+    if rows:
+        ids = insert_import_rows(connection, model, rows)
+        adjust_counter(connection, job.object_type, 0, len(rows))
+        # Rows inserted outside the ORM get their search documents here
+        index_search_rows(connection, job.object_type, model.id.in_(ids))
+        db.session.info.setdefault('changed_models', set()).add(model)
+    if errors:
+        connection.execute(db.insert(ImportRowError), [
+            {'job_id': job.id, 'row_number': row_number, 'message': '; '.join(messages)}
+            for row_number, messages in sorted(errors)
+        ])
+
+    job.rows_processed += len(batch)
+    job.inserted += len(rows)
+    job.failed += len(errors)
+    db.session.commit()
+    if rows and job.object_type in AUTOCOMPLETE_MODELS:
+        # Rows inserted outside the ORM are picked up by the next background reload
+        autocomplete_index.stale = True
+
+def run_import(job, stream, batch_size=None):
+    """Import rows from an open text stream into the job's object type.
+
+    Each batch is committed with the job's progress, so a failed or interrupted
+    job can be resumed with the same input: rows covered by committed batches
+    are skipped. Rejected rows are recorded as ImportRowError rows.
+    """
+    model = IMPORT_MODELS[job.object_type]
+    columns = import_columns(model)
+    batch_size = batch_size or app.config['IMPORT_BATCH_SIZE']
+
+    job.status = 'running'
+    job.message = None
+    db.session.commit()
+    try:
+        rows = itertools.islice(read_import_rows(stream, job.format, columns), job.rows_processed, None)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            import_batch(job, model, columns, batch)
+        job.status = 'completed'
+    except Exception as e:
+        db.session.rollback()
+        job.status = 'failed'
+        job.message = str(e)
+    db.session.commit()
+    return job
+
+def import_error_report(job_id):
+    """Yield a job's rejected rows as CSV lines."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['row_number', 'message'])
+    errors = db.session.execute(
+        db.select(ImportRowError.row_number, ImportRowError.message)
+        .where(ImportRowError.job_id == job_id)
+        .order_by(ImportRowError.row_number)
+        .execution_options(yield_per=app.config['IMPORT_BATCH_SIZE'])
+    )
+    for row in errors:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+@app.cli.command('import-records')
+@click.argument('object_type', type=click.Choice(list(IMPORT_MODELS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(IMPORT_FORMATS), help='Input format (default: from the file extension).')
+@click.option('--batch-size', type=int, help='Rows per transaction.')
+@click.option('--resume', 'resume_id', type=int, help='Continue an earlier import job from its last committed batch.')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False), help='Write the per-row error report to this CSV file.')
+def import_records_command(object_type, path, format, batch_size, resume_id, errors_path):
+    """Bulk import contacts, accounts, opportunities or leads from CSV or NDJSON."""
+    if resume_id:
+        job = db.session.get(ImportJob, resume_id)
+        if job is None or job.object_type != object_type:
+            raise click.ClickException(f"No {object_type} import job #{resume_id}")
+        if job.status == 'completed':
+            print(f"✅ Import job #{job.id} is already complete")
+            return
+        print(f"🔄 Resuming import job #{job.id} after row {job.rows_processed}")
+    else:
+        job = ImportJob(object_type=object_type, filename=os.path.basename(path), format=format or import_format_for(path))
+        db.session.add(job)
+        db.session.commit()
+        print(f"📥 Started import job #{job.id}")
+
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        run_import(job, stream, batch_size)
+
+    if errors_path:
+        with open(errors_path, 'w', newline='') as report:
+            report.writelines(import_error_report(job.id))
+
+    print(f"📊 Rows: {job.rows_processed}, inserted: {job.inserted}, rejected: {job.failed}")
+    if job.status == 'completed':
+        print(f"🎉 Import job #{job.id} complete")
+    else:
+        print(f"❌ Import job #{job.id} failed: {job.message}")
+        print(f"🔄 Resume with --resume {job.id}")
+
+# Streaming export
+EXPORT_MODELS = IMPORT_MODELS
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+def export_value(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+def export_lines(names, rows, format, batch_size=None):
+    """Yield a header and then the rows as CSV or NDJSON text, one chunk per batch."""
+    batch_size = batch_size or app.config['EXPORT_BATCH_SIZE']
+    buffer = io.StringIO()
+    if format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        write = lambda row: writer.writerow([export_value(value) for value in row])
+    else:
+        write = lambda row: buffer.write(json.dumps(dict(zip(names, row)), default=export_value) + '\n')
+
+    for count, row in enumerate(rows, start=1):
+        write(row)
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def stream_rows(statement, batch_size=None):
+    """Execute a statement through a server-side cursor and yield its rows.
+
+    yield_per fetches rows in batches (a named cursor on PostgreSQL), so
+    memory stays constant however large the result is.
+    """
+    batch_size = batch_size or app.config['EXPORT_BATCH_SIZE']
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield from partition
+
+def export_records(object_type, format):
+    """Yield an export of every row of a standard object."""
+    columns = EXPORT_MODELS[object_type].__table__.columns
+    statement = db.select(*columns).order_by(columns.id)
+    return export_lines([column.key for column in columns], stream_rows(statement), format)
+
+def export_custom_records(custom_object, format):
+    """Yield an export of a custom object's records with data flattened into one column per field."""
+    names = [field['name'] for field in get_custom_schema(custom_object).fields]
+    statement = (
+        db.select(CustomRecord.id, CustomRecord.created_at, CustomRecord.data)
+        .where(CustomRecord.object_id == custom_object.id)
+        .order_by(CustomRecord.id)
+    )
+
+    def rows():
+        for row in stream_rows(statement):
+            data = safe_json_load(row.data)
+            if not isinstance(data, dict):
+                data = {}
+            yield [row.id, row.created_at] + [data.get(name) for name in names]
+
+    return export_lines(['id', 'created_at'] + names, rows(), format)
+
+def export_response(lines, filename, format):
+    return Response(
+        stream_with_context(lines),
+        mimetype=EXPORT_FORMATS[format],
+        headers={'Content-Disposition': f'attachment; filename={filename}.{format}'}
+    )
+
+# JSON API
+# Standard objects exposed under /api/v1/<resource>, keyed by resource name
+API_RESOURCES = {
+    'contacts': 'contact',
+    'accounts': 'account',
+    'opportunities': 'opportunity',
+    'leads': 'lead'
+}
+
+class ApiCollection:
+    """How the JSON API lists, validates and writes one standard object type."""
+
+    def __init__(self, object_type):
+        self.object_type = object_type
+        self.object_id = None
+        self.model = IMPORT_MODELS[object_type]
+        self.columns = import_columns(self.model)
+
+    def allowed(self, permission):
+        return has_permission(current_user, self.object_type, self.object_id, permission)
+
+    def query(self):
+        return self.model.query
+
+    def load(self, ids):
+        """Return the records with the given ids, keyed by id, in one query."""
+        return {record.id: record for record in self.query().filter(self.model.id.in_(ids))}
+
+    def paginate(self, args):
+        return paginate_list(self.model, self.object_type, query=self.query(), args=args)
+
+    def serialize(self, record):
+        return {key: export_value(value) for key, value in model_snapshot(record).items()}
+
+    def validate(self, record, partial=False):
+        """Return (values, errors) for one incoming record.
+
+        A partial record (an update) only carries the columns being changed.
+        """
+        if not partial:
+            return coerce_import_row(self.columns, record)
+
+        values, errors = {}, []
+        for name, raw in record.items():
+            column = self.columns.get(name)
+            if column is None:
+                errors.append(f"unknown column {name}")
+                continue
+            try:
+                values[name] = coerce_import_value(column, raw)
+            except ValueError as e:
+                errors.append(str(e))
+                continue
+            if values[name] is None and not column.nullable:
+                errors.append(f"{name} is required")
+        return values, errors
+
+    def missing_references(self, rows):
+        return missing_references(self.columns, rows)
+
+    def create(self, values):
+        return self.model(**values)
+
+    def update(self, record, values):
+        for name, value in values.items():
+            setattr(record, name, value)
+
+class CustomRecordCollection(ApiCollection):
+    """JSON API access to the records of one custom object.
+
+    Records are read and written as {"data": {field: value}}; only the
+    object's defined fields are accepted and updates merge into the stored data.
+    """
+
+    def __init__(self, custom_object):
+        self.object_type = 'custom_object'
+        self.object_id = custom_object.id
+        self.model = CustomRecord
+        self.schema = get_custom_schema(custom_object)
+
+    def query(self):
+        return CustomRecord.query.filter_by(object_id=self.object_id)
+
+    def load(self, ids):
+        # Deleting a record deletes its typed values too; load them up front
+        query = self.query().filter(CustomRecord.id.in_(ids)).options(db.selectinload(CustomRecord.values))
+        return {record.id: record for record in query}
+
+    def paginate(self, args):
+        sort, direction, per_page = list_page_args(('created_at',), args)
+        cursor = decode_cursor(args['cursor'], CustomRecord.created_at) if args.get('cursor') else None
+        items, next_cursor, prev_cursor = keyset_paginate(
+            self.query(), CustomRecord.created_at, CustomRecord.id,
+            cursor=cursor, per_page=per_page, descending=direction == 'desc'
+        )
+        return KeysetPage(items, sort, direction, per_page, ('created_at',), next_cursor, prev_cursor)
+
+    def serialize(self, record):
+        return {
+            'id': record.id,
+            'object_id': record.object_id,
+            'data': safe_json_load(record.data),
+            'created_at': export_value(record.created_at),
+            'updated_at': export_value(record.updated_at)
+        }
+
+    def validate(self, record, partial=False):
+        errors = [f"unknown key {key}" for key in record if key != 'data']
+        data = record.get('data', {})
+        if not isinstance(data, dict):
+            return {}, errors + ['data must be an object']
+
+        errors += [f"unknown field {name}" for name in data if name not in self.schema.fields_by_name]
+        # Stored as strings, the same as records entered through the form
+        data = {name: '' if value is None else str(value) for name, value in data.items() if name in self.schema.fields_by_name}
+        errors += self.schema.validate(data)
+        if not partial:
+            data = dict({field['name']: '' for field in self.schema.fields}, **data)
+        return {'data': data}, errors
+
+    def missing_references(self, rows):
+        return {}
+
+    def create(self, values):
+        return CustomRecord(object_id=self.object_id, data=json.dumps(values['data']))
+
+    def update(self, record, values):
+        data = safe_json_load(record.data)
+        data.update(values['data'])
+        record.data = json.dumps(data)
+
+def api_error(message, status, errors=None):
+    body = {'error': message}
+    if errors:
+        body['errors'] = errors
+    return jsonify(body), status
+
+def api_login_required(view):
+    """Like login_required, but answers with a JSON 401 instead of redirecting."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return api_error('Authentication required', 401)
+        return view(*args, **kwargs)
+    return wrapper
+
+def api_batch_payload(key):
+    """Return the list under key in the JSON body, or raise ValueError describing what is wrong."""
+    body = request.get_json(silent=True)
+    items = body.get(key) if isinstance(body, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ValueError(f'Request body must be a JSON object with a non-empty "{key}" list')
+    if len(items) > app.config['API_MAX_BATCH_SIZE']:
+        raise ValueError(f"At most {app.config['API_MAX_BATCH_SIZE']} {key} per request")
+    return items
+
+def api_ids(values):
+    """Parse a list of record ids, raising ValueError on anything that is not an integer."""
+    ids = []
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).strip().isdigit():
+            raise ValueError(f"Invalid id {value!r}")
+        ids.append(int(value))
+    return ids
+
+def api_list(collection):
+    page = collection.paginate(request.args)
+    return jsonify({
+        'records': [collection.serialize(record) for record in page.items],
+        'sort': page.sort,
+        'dir': page.direction,
+        'per_page': page.per_page,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor
+    })
+
+def api_batch_get(collection):
+    try:
+        ids = api_ids(request.args.get('ids', '').split(','))
+    except ValueError as e:
+        return api_error(str(e), 400)
+    if len(ids) > app.config['API_MAX_BATCH_SIZE']:
+        return api_error(f"At most {app.config['API_MAX_BATCH_SIZE']} ids per request", 400)
+
+    records = collection.load(ids)
+    return jsonify({
+        'records': [collection.serialize(records[id]) for id in dict.fromkeys(ids) if id in records],
+        'missing': [id for id in dict.fromkeys(ids) if id not in records]
+    })
+
+def api_batch_create(collection):
+    try:
+        items = api_batch_payload('records')
+    except ValueError as e:
+        return api_error(str(e), 400)
+
+    valid, errors = {}, []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({'index': index, 'messages': ['record must be an object']})
+            continue
+        values, messages = collection.validate(item)
+        if messages:
+            errors.append({'index': index, 'messages': messages})
+        else:
+            valid[index] = values
+    indexes = list(valid)
+    for position, messages in collection.missing_references(list(valid.values())).items():
+        errors.append({'index': indexes[position], 'messages': messages})
+    if errors:
+        return api_error('Validation failed; no records were created', 422, sorted(errors, key=lambda error: error['index']))
+
+    records = [collection.create(values) for values in valid.values()]
+    db.session.add_all(records)
+    db.session.flush()
+    body = {'records': [collection.serialize(record) for record in records]}
+    db.session.commit()
+    return jsonify(body), 201
+
+def api_batch_update(collection):
+    try:
+        items = api_batch_payload('records')
+        if not all(isinstance(item, dict) for item in items):
+            raise ValueError('Every record must be an object')
+        ids = api_ids([item.get('id') for item in items])
+    except ValueError as e:
+        return api_error(str(e), 400)
+    if len(set(ids)) != len(ids):
+        return api_error('Each id may appear only once per request', 400)
+
+    records = collection.load(ids)
+    changes, errors = [], []
+    for index, (id, item) in enumerate(zip(ids, items)):
+        if id not in records:
+            errors.append({'index': index, 'messages': [f"record {id} does not exist"]})
+            continue
+        values, messages = collection.validate({key: value for key, value in item.items() if key != 'id'}, partial=True)
+        if messages:
+            errors.append({'index': index, 'messages': messages})
+        else:
+            changes.append((index, records[id], values))
+    for position, messages in collection.missing_references([values for _, _, values in changes]).items():
+        errors.append({'index': changes[position][0], 'messages': messages})
+    if errors:
+        return api_error('Validation failed; no records were updated', 422, sorted(errors, key=lambda error: error['index']))
+
+    for _, record, values in changes:
+        collection.update(record, values)
+    db.session.flush()
+    body = {'records': [collection.serialize(record) for _, record, _ in changes]}
+    db.session.commit()
+    return jsonify(body)
+
+def api_batch_delete(collection):
+    try:
+        ids = api_ids(api_batch_payload('ids'))
+    except ValueError as e:
+        return api_error(str(e), 400)
+
+    records = collection.load(ids)
+    missing = [id for id in dict.fromkeys(ids) if id not in records]
+    if missing:
+        return api_error('Some records do not exist; no records were deleted', 404, [
+            {'id': id, 'messages': [f"record {id} does not exist"]} for id in missing
+        ])
+
+    for record in records.values():
+        db.session.delete(record)
+    db.session.commit()
+    return jsonify({'deleted': len(records)})
+
+# Each operation and the permission it needs; checked once per request, never per record
+API_OPERATIONS = {
+    'list': (api_list, 'view'),
+    'batch_get': (api_batch_get, 'view'),
+    'create': (api_batch_create, 'create'),
+    'update': (api_batch_update, 'edit'),
+    'delete': (api_batch_delete, 'delete')
+}
+
+API_METHOD_OPERATIONS = {
+    'GET': 'list',
+    'POST': 'create',
+    'PATCH': 'update',
+    'DELETE': 'delete'
+}
+
+def api_dispatch(collection, operation):
+    handler, permission = API_OPERATIONS[operation]
+    if not collection.allowed(permission):
+        return api_error(f'You do not have {permission} permission on these records', 403)
+    return handler(collection)
+
+def api_get_one(collection, id):
+    if not collection.allowed('view'):
+        return api_error('You do not have view permission on these records', 403)
+    records = collection.load([id])
+    if id not in records:
+        return api_error(f"Record {id} does not exist", 404)
+    return jsonify(collection.serialize(records[id]))
+
+# Dashboard helpers
+DASHBOARD_MODELS = (Contact, Account, Opportunity, Lead, CustomObject)
+
+# One shared payload per worker; every dashboard view is identical for all users
+dashboard_cache = TTLCache(app.config['DASHBOARD_CACHE_TTL'])
+
+def aggregate_counts():
+    """Count every dashboard object type in a single statement."""
+    counts = db.session.execute(db.select(*[
+        db.select(db.func.count()).select_from(model).scalar_subquery().label(model.__tablename__)
+        for model in DASHBOARD_MODELS
+    ])).one()
+    return counts._asdict()
+
+def read_dashboard_counters():
+    """Return the maintained dashboard counters that exist, keyed by object type."""
+    names = [COUNTED_MODELS[model] for model in DASHBOARD_MODELS]
+    return dict(db.session.execute(
+        db.select(RecordCounter.object_type, RecordCounter.count)
+        .where(RecordCounter.object_type.in_(names), RecordCounter.object_id == 0)
+    ).all())
+
+def dashboard_counts():
+    """Read the dashboard totals from the maintained counters.
+
+    Until `flask init-db` or `flask reconcile-counters` has built them, the
+    tables are counted directly; a page view never writes or locks counters.
+    """
+    counts = read_dashboard_counters()
+    if len(counts) < len(DASHBOARD_MODELS):
+        counts = aggregate_counts()
+    return counts
+
+def ensure_counters():
+    """Build the record counters if this database does not have them yet."""
+    if len(read_dashboard_counters()) == len(DASHBOARD_MODELS):
+        return False
+    reconcile_counters()
+    return True
+
+def build_dashboard_payload():
+    counts = dashboard_counts()
+    recent_contacts = Contact.query.order_by(Contact.created_at.desc()).limit(5).all()
+    recent_opportunities = Opportunity.query.order_by(Opportunity.created_at.desc()).limit(5).all()
+    recent_custom_objects = CustomObject.query.order_by(CustomObject.created_at.desc()).limit(3).all()
+
+    return {
+        'contacts_count': counts['contact'],
+        'accounts_count': counts['account'],
+        'opportunities_count': counts['opportunity'],
+        'leads_count': counts['lead'],
+        'custom_objects_count': counts['custom_object'],
+        'recent_contacts': [model_snapshot(contact) for contact in recent_contacts],
+        'recent_opportunities': [model_snapshot(opportunity) for opportunity in recent_opportunities],
+        'recent_custom_objects': [model_snapshot(obj) for obj in recent_custom_objects]
+    }
+
+def get_dashboard_payload():
+    payload = dashboard_cache.get('dashboard')
+    if payload is None:
+        payload = build_dashboard_payload()
+        dashboard_cache.set('dashboard', payload)
+    return payload
+
+@on_models_committed
+def invalidate_dashboard(changed_models):
+    if changed_models.intersection(DASHBOARD_MODELS):
+        dashboard_cache.clear()
+
+# Register template functions
+app.jinja_env.globals['has_permission'] = has_permission
+app.jinja_env.globals['custom_schema'] = get_custom_schema
+
+# Login throttling
+def window_estimate(current, previous, window, now):
+    """Sliding-window count from two fixed windows: all of the current one plus the unexpired share of the previous one."""
+    elapsed = (now % window) / window
+    return current + previous * (1 - elapsed)
+
+class MemoryWindowCounter:
+    """Per-process sliding-window counters holding three numbers per key."""
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._windows = {}  # key -> [window index, current count, previous count]
+        self._lock = threading.Lock()
+
+    def _current(self, key, window, now):
+        index = int(now // window)
+        entry = self._windows.get(key)
+        if entry is None:
+            return None
+        if entry[0] != index:
+            # Roll forward: the old current window is the previous one only if adjacent
+            entry[2] = entry[1] if entry[0] == index - 1 else 0
+            entry[1] = 0
+            entry[0] = index
+        return entry
+
+    def count(self, key, window, now):
+        with self._lock:
+            entry = self._current(key, window, now)
+            return window_estimate(entry[1], entry[2], window, now) if entry else 0
+
+    def add(self, key, window, now):
+        with self._lock:
+            entry = self._current(key, window, now)
+            if entry is None:
+                if len(self._windows) >= self.max_keys:
+                    self._evict(int(now // window))
+                entry = self._windows[key] = [int(now // window), 0, 0]
+            entry[1] += 1
+
+    def reset(self, key):
+        with self._lock:
+            self._windows.pop(key, None)
+
+    def _evict(self, index):
+        # Drop keys with nothing in the last two windows, then the oldest inserted
+        for key in [key for key, entry in self._windows.items() if entry[0] < index - 1]:
+            del self._windows[key]
+        while len(self._windows) >= self.max_keys:
+            del self._windows[next(iter(self._windows))]
+
+class RedisWindowCounter:
+    """The same sliding windows kept in Redis so every worker and instance shares them."""
+
+    def __init__(self, url=None, client=None):
+        if client is None:
+            import redis  # optional dependency, only needed with LOGIN_THROTTLE_REDIS_URL
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    def _keys(self, key, window, now):
+        index = int(now // window)
+        return f'login-throttle:{key}:{index}', f'login-throttle:{key}:{index - 1}'
+
+    def count(self, key, window, now):
+        current, previous = self.client.mget(self._keys(key, window, now))
+        return window_estimate(int(current or 0), int(previous or 0), window, now)
+
+    def add(self, key, window, now):
+        current, _ = self._keys(key, window, now)
+        pipeline = self.client.pipeline()
+        pipeline.incr(current)
+        pipeline.expire(current, int(window * 2) + 1)
+        pipeline.execute()
+
+    def reset(self, key):
+        self.client.delete(*self._keys(key, app.config['LOGIN_WINDOW_SECONDS'], time.time()))
+
+class LoginThrottle:
+    """Per-IP and per-username login limits, checked before any database or hashing work."""
+
+    def __init__(self, backend=None):
+        self.backend = backend
+
+    def _backend(self):
+        if self.backend is None:
+            url = app.config['LOGIN_THROTTLE_REDIS_URL']
+            self.backend = RedisWindowCounter(url) if url else MemoryWindowCounter(app.config['LOGIN_THROTTLE_MAX_KEYS'])
+        return self.backend
+
+    def retry_after(self, ip, username, now=None):
+        """Seconds until this attempt may be made, or 0 if it is allowed now."""
+        now = time.time() if now is None else now
+        window = app.config['LOGIN_WINDOW_SECONDS']
+        backend = self._backend()
+        for scope, key, limit in (('ip', f'ip:{ip}', app.config['LOGIN_MAX_ATTEMPTS_PER_IP']),
+                                  ('username', f'user:{username}', app.config['LOGIN_MAX_FAILURES_PER_USERNAME'])):
+            if backend.count(key, window, now) >= limit:
+                metrics.inc('crm_login_throttled_total', metric_labels(scope=scope))
+                return max(1, math.ceil(window - now % window))
+        return 0
+
+    def record_attempt(self, ip, now=None):
+        self._backend().add(f'ip:{ip}', app.config['LOGIN_WINDOW_SECONDS'], time.time() if now is None else now)
+
+    def record_failure(self, username, now=None):
+        self._backend().add(f'user:{username}', app.config['LOGIN_WINDOW_SECONDS'], time.time() if now is None else now)
+
+    def record_success(self, username):
+        self._backend().reset(f'user:{username}')
+
+login_throttle = LoginThrottle()
+
+# Password hashing
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing pool already has PASSWORD_HASH_QUEUE_LIMIT checks waiting."""
+
+class PasswordHasher:
+    """Bounded thread pool for password hashing and verification.
+
+    hashlib releases the GIL while hashing, so the pool uses spare cores while
+    capping how many request threads can be tied up by a login storm.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.rejected = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _run(self, operation, function, *args):
+        with self._lock:
+            limit = app.config['PASSWORD_HASH_WORKERS'] + app.config['PASSWORD_HASH_QUEUE_LIMIT']
+            if self.in_flight >= limit:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            if self._executor is None:
+                # Created on first use so gunicorn's preload fork never copies dead threads
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    app.config['PASSWORD_HASH_WORKERS'], thread_name_prefix='password-hash'
+                )
+            self.in_flight += 1
+        future = self._executor.submit(self._timed, operation, function, *args)
+        future.add_done_callback(self._finished)
+        try:
+            return future.result(timeout=app.config['PASSWORD_HASH_TIMEOUT'])
+        except concurrent.futures.TimeoutError:
+            raise PasswordHasherBusy()
+
+    def _timed(self, operation, function, *args):
+        started = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            metrics.observe('crm_password_hash_seconds', metric_labels(operation=operation), time.perf_counter() - started)
+
+    def _finished(self, future):
+        with self._lock:
+            self.in_flight -= 1
+
+    def hash(self, password):
+        return self._run('hash', generate_password_hash, password, app.config['PASSWORD_HASH_METHOD'])
+
+    def verify(self, pwhash, password):
+        return self._run('verify', check_password_hash, pwhash, password)
+
+    def hash_many(self, passwords, workers=None, method=None):
+        """Hash a batch of passwords on a pool of its own, so bulk work never fills the login queue."""
+        method = method or app.config['PASSWORD_HASH_METHOD']
+        workers = workers or app.config['PASSWORD_HASH_WORKERS']
+        with concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix='password-hash-bulk') as executor:
+            return list(executor.map(lambda password: self._timed('hash', generate_password_hash, password, method), passwords))
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': self.in_flight, 'rejected': self.rejected}
+
+password_hasher = PasswordHasher()
+
+@functools.lru_cache(maxsize=None)
+def hash_method_prefix(method):
+    """The method-and-cost prefix Werkzeug writes for a method string, e.g. pbkdf2:sha256:600000."""
+    return generate_password_hash('', method).split('$', 1)[0]
+
+def password_needs_rehash(pwhash):
+    return pwhash.split('$', 1)[0] != hash_method_prefix(app.config['PASSWORD_HASH_METHOD'])
+
+@app.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(error):
+    return 'Too many password checks in progress; please try again shortly.', 503, {'Retry-After': '1'}
+
+# Metrics
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_HELP = {
+    'crm_request_duration_seconds': ('histogram', 'Request latency by endpoint'),
+    'crm_template_render_seconds': ('histogram', 'Template render time by template'),
+    'crm_db_queries_total': ('counter', 'SQL statements executed by endpoint'),
+    'crm_db_seconds_total': ('counter', 'Time spent executing SQL by endpoint'),
+    'crm_db_pool_checkouts_total': ('counter', 'Connections checked out of the pool'),
+    'crm_db_pool_timeouts_total': ('counter', 'Pool checkouts that timed out'),
+    'crm_db_pool_wait_seconds_total': ('counter', 'Time spent waiting for a pooled connection'),
+    'crm_db_pool_in_use': ('gauge', 'Connections currently checked out'),
+    'crm_cache_hits_total': ('counter', 'Cache hits by cache'),
+    'crm_cache_misses_total': ('counter', 'Cache misses by cache'),
+    'crm_cache_entries': ('gauge', 'Entries held by cache'),
+    'crm_password_hash_seconds': ('histogram', 'Password hash and verify time by operation'),
+    'crm_password_hash_in_flight': ('gauge', 'Password checks running or queued'),
+    'crm_password_hash_rejected_total': ('counter', 'Password checks refused because the queue was full'),
+    'crm_login_throttled_total': ('counter', 'Login attempts refused by the throttle by scope')
+}
+
+METRIC_CACHES = {
+    'permission': permission_cache,
+    'custom_schema': custom_schema_cache,
+    'dashboard': dashboard_cache,
+    'identity': identity_cache
+}
+
+def metric_labels(**labels):
+    """Render labels in exposition format; the result doubles as the series key."""
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in labels.items())
+
+class MetricsRegistry:
+    """Per-process counters and histograms, snapshotted as plain JSON for cross-worker merging."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counters = {}
+        self.histograms = {}
+        self.flushed_at = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + amount
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            # One count per bucket, then sum and count
+            counts = series.setdefault(labels, [0] * (len(self.buckets) + 2))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {
+                'pid': os.getpid(),
+                'counters': {name: dict(series) for name, series in self.counters.items()},
+                'gauges': {},
+                'histograms': {name: {labels: list(counts) for labels, counts in series.items()}
+                               for name, series in self.histograms.items()}
+            }
+        collect_runtime_metrics(snapshot)
+        return snapshot
 
-class Account(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    industry = db.Column(db.String(50))
-    website = db.Column(db.String(200))
-    phone = db.Column(db.String(20))
-    address = db.Column(db.Text)
-    annual_revenue = db.Column(db.Float)
-    employees = db.Column(db.Integer)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+metrics = MetricsRegistry()
 
-class Opportunity(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    account_id = db.Column(db.Integer, db.ForeignKey('account.id'))
-    contact_id = db.Column(db.Integer, db.ForeignKey('contact.id'))
-    amount = db.Column(db.Float)
-    stage = db.Column(db.String(50))
-    close_date = db.Column(db.Date)
-    probability = db.Column(db.Integer)
-    description = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+def collect_runtime_metrics(snapshot):
+    """Add pool and cache statistics, which their owners already count, to a snapshot."""
+    counters, gauges = snapshot['counters'], snapshot['gauges']
+    stats = pool_metrics.stats()
+    counters['crm_db_pool_checkouts_total'] = {'': stats['checkouts']}
+    counters['crm_db_pool_timeouts_total'] = {'': stats['timeouts']}
+    counters['crm_db_pool_wait_seconds_total'] = {'': stats['wait_seconds_total']}
+    gauges['crm_db_pool_in_use'] = {'': stats['in_use']}
+    for name, cache in METRIC_CACHES.items():
+        stats = cache.stats()
+        labels = metric_labels(cache=name)
+        counters.setdefault('crm_cache_hits_total', {})[labels] = stats['hits']
+        counters.setdefault('crm_cache_misses_total', {})[labels] = stats['misses']
+        gauges.setdefault('crm_cache_entries', {})[labels] = stats['size']
+    stats = password_hasher.stats()
+    gauges['crm_password_hash_in_flight'] = {'': stats['in_flight']}
+    counters['crm_password_hash_rejected_total'] = {'': stats['rejected']}
 
-class Lead(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    first_name = db.Column(db.String(50), nullable=False)
-    last_name = db.Column(db.String(50), nullable=False)
-    email = db.Column(db.String(120))
-    phone = db.Column(db.String(20))
-    company = db.Column(db.String(100))
-    status = db.Column(db.String(50), default='New')
-    source = db.Column(db.String(50))
-    notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+def flush_metrics(force=False):
+    """Write this worker's snapshot to METRICS_DIR if the last write is old enough."""
+    directory = app.config['METRICS_DIR']
+    now = time.monotonic()
+    if not directory or (not force and now - metrics.flushed_at < app.config['METRICS_FLUSH_SECONDS']):
+        return
+    metrics.flushed_at = now
+    path = os.path.join(directory, f'worker-{os.getpid()}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(metrics.snapshot(), f)
+    os.replace(path + '.tmp', path)
 
-# Custom Objects System
-class CustomObject(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), unique=True, nullable=False)
-    label = db.Column(db.String(100), nullable=False)
-    description = db.Column(db.Text)
-    fields = db.Column(db.Text)  # JSON string of field definitions
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
 
-class CustomRecord(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    object_id = db.Column(db.Integer, db.ForeignKey('custom_object.id'))
-    data = db.Column(db.Text)  # JSON string of field values
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+def worker_snapshots():
+    """Snapshots of every worker sharing METRICS_DIR, or just this one without it."""
+    directory = app.config['METRICS_DIR']
+    if not directory:
+        return [metrics.snapshot()]
+    flush_metrics(force=True)
+    snapshots = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith('worker-') and name.endswith('.json'):
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # removed or being replaced
+    return snapshots
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
+def merge_snapshots(snapshots):
+    """Sum counters and histograms from every worker ever seen; gauges only from live ones."""
+    merged = {'counters': {}, 'gauges': {}, 'histograms': {}}
+    for snapshot in snapshots:
+        for name, series in snapshot['counters'].items():
+            target = merged['counters'].setdefault(name, {})
+            for labels, value in series.items():
+                target[labels] = target.get(labels, 0) + value
+        if process_alive(snapshot['pid']):
+            for name, series in snapshot['gauges'].items():
+                target = merged['gauges'].setdefault(name, {})
+                for labels, value in series.items():
+                    target[labels] = target.get(labels, 0) + value
+        for name, series in snapshot['histograms'].items():
+            target = merged['histograms'].setdefault(name, {})
+            for labels, counts in series.items():
+                total = target.setdefault(labels, [0] * len(counts))
+                for index, value in enumerate(counts):
+                    total[index] += value
+    return merged
 
-# Permission helper functions
-def has_permission(user, object_type, object_id=None, permission='view'):
-    """Check if user has permission for a specific object type and permission level."""
-    if user.role == 'admin':
-        return True
-    
-    permission_map = {
-        'view': 'can_view',
-        'create': 'can_create', 
-        'edit': 'can_edit',
-        'delete': 'can_delete'
-    }
-    
-    permission_field = permission_map.get(permission, 'can_view')
-    
-    # First check direct user permissions
-    query = UserPermission.query.filter_by(
-        user_id=user.id,
-        object_type=object_type,
-        object_id=object_id
-    )
-    
-    if object_id is None:
-        # For standard objects, check general permissions
-        query = query.filter_by(object_id=None)
-    
-    user_permission = query.first()
-    
-    if user_permission:
-        return getattr(user_permission, permission_field, False)
-    
-    # If no direct permission, check permission sets
-    user_permission_sets = UserPermissionSet.query.filter_by(user_id=user.id).all()
-    
-    for user_ps in user_permission_sets:
-        permission_set = PermissionSet.query.get(user_ps.permission_set_id)
-        if permission_set and permission_set.is_active:
-            # Check permission set permissions
-            ps_query = PermissionSetPermission.query.filter_by(
-                permission_set_id=permission_set.id,
-                object_type=object_type,
-                object_id=object_id
-            )
-            
-            if object_id is None:
-                ps_query = ps_query.filter_by(object_id=None)
-            
-            ps_permission = ps_query.first()
-            
-            if ps_permission:
-                return getattr(ps_permission, permission_field, False)
-    
-    return False
+def render_metrics(merged):
+    """Prometheus text exposition of merged snapshots."""
+    lines = []
+    for name in sorted(set(merged['counters']) | set(merged['gauges']) | set(merged['histograms'])):
+        kind, help_text = METRIC_HELP.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'histogram':
+            for labels, counts in sorted(merged['histograms'][name].items()):
+                prefix = labels + ',' if labels else ''
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{labels}}} {counts[-2]:.6f}')
+                lines.append(f'{name}_count{{{labels}}} {counts[-1]}')
+        else:
+            series = merged['counters'].get(name) or merged['gauges'].get(name, {})
+            for labels, value in sorted(series.items()):
+                lines.append(f'{name}{{{labels}}} {value}' if labels else f'{name} {value}')
+    return '\n'.join(lines) + '\n'
 
-def get_user_permissions(user):
-    """Get all permissions for a user."""
-    if user.role == 'admin':
-        return {
-            'contact': {'view': True, 'create': True, 'edit': True, 'delete': True},
-            'account': {'view': True, 'create': True, 'edit': True, 'delete': True},
-            'opportunity': {'view': True, 'create': True, 'edit': True, 'delete': True},
-            'lead': {'view': True, 'create': True, 'edit': True, 'delete': True},
-            'custom_object': {'view': True, 'create': True, 'edit': True, 'delete': True}
-        }
-    
-    permissions = {}
-    user_perms = UserPermission.query.filter_by(user_id=user.id).all()
-    
-    for perm in user_perms:
-        if perm.object_type not in permissions:
-            permissions[perm.object_type] = {}
-        
-        permissions[perm.object_type][perm.object_id] = {
-            'view': perm.can_view,
-            'create': perm.can_create,
-            'edit': perm.can_edit,
-            'delete': perm.can_delete
-        }
-    
-    return permissions
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
 
-# Register template functions
-app.jinja_env.globals['has_permission'] = has_permission
+@app.after_request
+def record_request_metrics(response):
+    if 'request_started' in g:
+        labels = metric_labels(endpoint=request.endpoint or 'unmatched', method=request.method)
+        metrics.observe('crm_request_duration_seconds', labels, time.perf_counter() - g.request_started)
+        stats = request_sql_stats()
+        metrics.inc('crm_db_queries_total', labels, stats['count'])
+        metrics.inc('crm_db_seconds_total', labels, stats['seconds'])
+        flush_metrics()
+    return response
+
+@before_render_template.connect_via(app)
+def _start_render_timer(sender, template, context, **extra):
+    g.setdefault('render_started', []).append(time.perf_counter())
+
+@template_rendered.connect_via(app)
+def _record_render_time(sender, template, context, **extra):
+    started = g.get('render_started')
+    if started:
+        metrics.observe('crm_template_render_seconds', metric_labels(template=template.name), time.perf_counter() - started.pop())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(401)
+    return Response(render_metrics(merge_snapshots(worker_snapshots())), mimetype='text/plain; version=0.0.4')
 
 # Routes
 @app.route('/')
 @login_required
 def dashboard():
-    contacts_count = Contact.query.count()
-    accounts_count = Account.query.count()
-    opportunities_count = Opportunity.query.count()
-    leads_count = Lead.query.count()
-    custom_objects_count = CustomObject.query.count()
-    
-    recent_contacts = Contact.query.order_by(Contact.created_at.desc()).limit(5).all()
-    recent_opportunities = Opportunity.query.order_by(Opportunity.created_at.desc()).limit(5).all()
-    recent_custom_objects = CustomObject.query.order_by(CustomObject.created_at.desc()).limit(3).all()
-    
-    return render_template('dashboard.html', 
-                         contacts_count=contacts_count,
-                         accounts_count=accounts_count,
-                         opportunities_count=opportunities_count,
-                         leads_count=leads_count,
-                         custom_objects_count=custom_objects_count,
-                         recent_contacts=recent_contacts,
-                         recent_opportunities=recent_opportunities,
-                         recent_custom_objects=recent_custom_objects)
+    return render_template('dashboard.html', **get_dashboard_payload())
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
+        throttle_key = username.strip().lower()
+        
+        wait = login_throttle.retry_after(request.remote_addr, throttle_key)
+        if wait:
+            flash(f'Too many login attempts. Please try again in {wait} seconds.')
+            return render_template('login.html'), 429, {'Retry-After': str(wait)}
+        login_throttle.record_attempt(request.remote_addr)
+        
         user = User.query.filter_by(username=username).first()
         
-        if user and check_password_hash(user.password_hash, password):
+        try:
+            valid = user is not None and password_hasher.verify(user.password_hash, password)
+        except PasswordHasherBusy:
+            flash('Too many sign-ins right now. Please try again in a moment.')
+            return render_template('login.html'), 503, {'Retry-After': '1'}
+        
+        if valid:
+            if password_needs_rehash(user.password_hash):
+                try:
+                    user.password_hash = password_hasher.hash(password)
+                    db.session.commit()
+                except PasswordHasherBusy:
+                    pass  # upgraded on a later login
+            login_throttle.record_success(throttle_key)
             login_user(user)
             return redirect(url_for('dashboard'))
         else:
+            login_throttle.record_failure(throttle_key)
             flash('Invalid username or password')
     
     return render_template('login.html')
@@ -348,7 +3210,7 @@ def new_user():
         user = User(
             username=username, 
             email=email, 
-            password_hash=generate_password_hash(password),
+            password_hash=password_hasher.hash(password),
             role=role
         )
         db.session.add(user)
@@ -378,7 +3240,7 @@ def edit_user(id):
         user.is_active = 'is_active' in request.form
         
         if request.form.get('password'):
-            user.password_hash = generate_password_hash(request.form['password'])
+            user.password_hash = password_hasher.hash(request.form['password'])
         
         db.session.commit()
         flash('User updated successfully!')
@@ -396,50 +3258,12 @@ def user_permissions(id):
     user = User.query.get_or_404(id)
     
     if request.method == 'POST':
-        # Clear existing permissions
-        UserPermission.query.filter_by(user_id=user.id).delete()
-        
-        # Standard objects permissions
-        standard_objects = ['contact', 'account', 'opportunity', 'lead']
-        for obj_type in standard_objects:
-            can_view = f'{obj_type}_view' in request.form
-            can_create = f'{obj_type}_create' in request.form
-            can_edit = f'{obj_type}_edit' in request.form
-            can_delete = f'{obj_type}_delete' in request.form
-            
-            if can_view or can_create or can_edit or can_delete:
-                permission = UserPermission(
-                    user_id=user.id,
-                    object_type=obj_type,
-                    can_view=can_view,
-                    can_create=can_create,
-                    can_edit=can_edit,
-                    can_delete=can_delete
-                )
-                db.session.add(permission)
-        
-        # Custom objects permissions
-        custom_objects = CustomObject.query.all()
-        for custom_obj in custom_objects:
-            can_view = f'custom_{custom_obj.id}_view' in request.form
-            can_create = f'custom_{custom_obj.id}_create' in request.form
-            can_edit = f'custom_{custom_obj.id}_edit' in request.form
-            can_delete = f'custom_{custom_obj.id}_delete' in request.form
-            
-            if can_view or can_create or can_edit or can_delete:
-                permission = UserPermission(
-                    user_id=user.id,
-                    object_type='custom_object',
-                    object_id=custom_obj.id,
-                    can_view=can_view,
-                    can_create=can_create,
-                    can_edit=can_edit,
-                    can_delete=can_delete
-                )
-                db.session.add(permission)
-        
+        grants = permission_form_grants(request.form, CustomObject.query.all())
+        changes = sync_permission_rows(UserPermission, UserPermission.user_id, user.id, grants)
+        if any(changes):
+            bump_permission_version()
         db.session.commit()
-        flash('User permissions updated successfully!')
+        flash(f'User permissions updated successfully! {describe_changes(changes)}')
         return redirect(url_for('users'))
     
     # Get current permissions
@@ -458,26 +3282,123 @@ def user_permissions(id):
     custom_objects = CustomObject.query.all()
     return render_template('user_permissions.html', user=user, permissions=permissions_dict, custom_objects=custom_objects)
 
+def default_permission_rows(user_id, role):
+    """UserPermission rows a new user starts with: view access to the standard objects, or none for admins."""
+    if role == 'admin':
+        return []  # Admin has all permissions
+    return [
+        {'user_id': user_id, 'object_type': obj_type, 'can_view': True, 'can_create': False, 'can_edit': False, 'can_delete': False}
+        for obj_type in PERMISSION_OBJECT_TYPES
+    ]
+
 def set_default_permissions(user):
     """Set default permissions for a new user based on their role."""
-    if user.role == 'admin':
-        return  # Admin has all permissions
-    
-    # Set basic view permissions for standard objects
-    standard_objects = ['contact', 'account', 'opportunity', 'lead']
-    for obj_type in standard_objects:
-        permission = UserPermission(
-            user_id=user.id,
-            object_type=obj_type,
-            can_view=True,
-            can_create=False,
-            can_edit=False,
-            can_delete=False
-        )
-        db.session.add(permission)
+    rows = default_permission_rows(user.id, user.role)
+    if not rows:
+        return
     
+    db.session.execute(db.insert(UserPermission), rows)
+    bump_permission_version()
     db.session.commit()
 
+PERMISSION_OBJECT_TYPES = ('contact', 'account', 'opportunity', 'lead')
+PERMISSION_FLAGS = ('can_view', 'can_create', 'can_edit', 'can_delete')
+
+def permission_form_grants(form, custom_objects):
+    """Map (object_type, object_id) to the (view, create, edit, delete) flags ticked on a permissions form."""
+    prefixes = [(obj_type, None, obj_type) for obj_type in PERMISSION_OBJECT_TYPES]
+    prefixes += [('custom_object', custom_obj.id, f'custom_{custom_obj.id}') for custom_obj in custom_objects]
+    grants = {}
+    for object_type, object_id, prefix in prefixes:
+        flags = tuple(f'{prefix}_{action}' in form for action in PERMISSION_ACTIONS)
+        if any(flags):
+            grants[(object_type, object_id)] = flags
+    return grants
+
+def sync_permission_rows(model, owner_column, owner_id, grants):
+    """Make the permission rows of one user or permission set match grants.
+
+    Only rows that differ are touched, with one bulk statement each for
+    inserts, updates and deletes. Returns (inserted, updated, deleted).
+    """
+    existing = db.session.execute(
+        db.select(model.id, model.object_type, model.object_id, *[getattr(model, flag) for flag in PERMISSION_FLAGS])
+        .where(owner_column == owner_id)
+    ).all()
+
+    updates, deletes, seen = [], [], set()
+    for row in existing:
+        key = (row.object_type, row.object_id)
+        if key not in grants or key in seen:
+            deletes.append(row.id)  # revoked, or a duplicate left by the old delete-and-reinsert
+            continue
+        seen.add(key)
+        flags = tuple(bool(flag) for flag in row[3:])
+        if flags != grants[key]:
+            updates.append({'id': row.id, **dict(zip(PERMISSION_FLAGS, grants[key]))})
+    inserts = [
+        {owner_column.key: owner_id, 'object_type': object_type, 'object_id': object_id, **dict(zip(PERMISSION_FLAGS, flags))}
+        for (object_type, object_id), flags in grants.items() if (object_type, object_id) not in seen
+    ]
+
+    if inserts:
+        db.session.execute(db.insert(model), inserts)
+    if updates:
+        db.session.execute(db.update(model), updates)
+    if deletes:
+        db.session.execute(db.delete(model).where(model.id.in_(deletes)))
+    return len(inserts), len(updates), len(deletes)
+
+def sync_permission_set_assignments(user_id, set_ids, assigned_by):
+    """Assign exactly set_ids to a user, in the given order. Returns (inserted, updated, deleted).
+
+    Assignment order is row id order and decides which set wins a conflicting
+    grant, so existing rows are kept only while they already follow set_ids;
+    from the first row out of order on, rows are repointed at the remaining
+    sets and anything left over is inserted after them.
+    """
+    desired = list(dict.fromkeys(set_ids))
+    wanted = set(desired)
+    existing = db.session.execute(
+        db.select(UserPermissionSet.id, UserPermissionSet.permission_set_id)
+        .where(UserPermissionSet.user_id == user_id)
+        .order_by(UserPermissionSet.id)
+    ).all()
+
+    kept, spare, deletes = 0, [], []
+    for row in existing:
+        if not spare and kept < len(desired) and row.permission_set_id == desired[kept]:
+            kept += 1
+        elif spare or row.permission_set_id in wanted:
+            spare.append(row)
+        else:
+            deletes.append(row.id)  # revoked, and no kept row comes after it
+
+    remaining = desired[kept:]
+    updates = [
+        {'id': row.id, 'permission_set_id': set_id, 'assigned_by': assigned_by, 'assigned_at': datetime.utcnow()}
+        for row, set_id in zip(spare, remaining) if row.permission_set_id != set_id
+    ]
+    deletes.extend(row.id for row in spare[len(remaining):])
+    inserts = [
+        {'user_id': user_id, 'permission_set_id': set_id, 'assigned_by': assigned_by}
+        for set_id in remaining[len(spare):]
+    ]
+
+    if inserts:
+        db.session.execute(db.insert(UserPermissionSet), inserts)
+    if updates:
+        db.session.execute(db.update(UserPermissionSet), updates)
+    if deletes:
+        db.session.execute(db.delete(UserPermissionSet).where(UserPermissionSet.id.in_(deletes)))
+    return len(inserts), len(updates), len(deletes)
+
+def describe_changes(changes):
+    inserted, updated, deleted = changes
+    if not any(changes):
+        return 'No changes.'
+    return f'{inserted + updated + deleted} rows changed ({inserted} added, {updated} updated, {deleted} removed).'
+
 # Permission Set Routes
 @app.route('/permission-sets')
 @login_required
@@ -506,44 +3427,10 @@ def new_permission_set():
         db.session.commit()
         
         # Add permissions to the permission set
-        standard_objects = ['contact', 'account', 'opportunity', 'lead']
-        for obj_type in standard_objects:
-            can_view = f'{obj_type}_view' in request.form
-            can_create = f'{obj_type}_create' in request.form
-            can_edit = f'{obj_type}_edit' in request.form
-            can_delete = f'{obj_type}_delete' in request.form
-            
-            if can_view or can_create or can_edit or can_delete:
-                permission = PermissionSetPermission(
-                    permission_set_id=permission_set.id,
-                    object_type=obj_type,
-                    can_view=can_view,
-                    can_create=can_create,
-                    can_edit=can_edit,
-                    can_delete=can_delete
-                )
-                db.session.add(permission)
-        
-        # Custom objects permissions
-        custom_objects = CustomObject.query.all()
-        for custom_obj in custom_objects:
-            can_view = f'custom_{custom_obj.id}_view' in request.form
-            can_create = f'custom_{custom_obj.id}_create' in request.form
-            can_edit = f'custom_{custom_obj.id}_edit' in request.form
-            can_delete = f'custom_{custom_obj.id}_delete' in request.form
-            
-            if can_view or can_create or can_edit or can_delete:
-                permission = PermissionSetPermission(
-                    permission_set_id=permission_set.id,
-                    object_type='custom_object',
-                    object_id=custom_obj.id,
-                    can_view=can_view,
-                    can_create=can_create,
-                    can_edit=can_edit,
-                    can_delete=can_delete
-                )
-                db.session.add(permission)
+        grants = permission_form_grants(request.form, CustomObject.query.all())
+        sync_permission_rows(PermissionSetPermission, PermissionSetPermission.permission_set_id, permission_set.id, grants)
         
+        bump_permission_version()
         db.session.commit()
         flash('Permission set created successfully!')
         return redirect(url_for('permission_sets'))
@@ -561,54 +3448,17 @@ def edit_permission_set(id):
     permission_set = PermissionSet.query.get_or_404(id)
     
     if request.method == 'POST':
+        was_active = permission_set.is_active
         permission_set.name = request.form['name']
         permission_set.description = request.form['description']
         permission_set.is_active = 'is_active' in request.form
         
-        # Clear existing permissions
-        PermissionSetPermission.query.filter_by(permission_set_id=permission_set.id).delete()
-        
-        # Standard objects permissions
-        standard_objects = ['contact', 'account', 'opportunity', 'lead']
-        for obj_type in standard_objects:
-            can_view = f'{obj_type}_view' in request.form
-            can_create = f'{obj_type}_create' in request.form
-            can_edit = f'{obj_type}_edit' in request.form
-            can_delete = f'{obj_type}_delete' in request.form
-            
-            if can_view or can_create or can_edit or can_delete:
-                permission = PermissionSetPermission(
-                    permission_set_id=permission_set.id,
-                    object_type=obj_type,
-                    can_view=can_view,
-                    can_create=can_create,
-                    can_edit=can_edit,
-                    can_delete=can_delete
-                )
-                db.session.add(permission)
-        
-        # Custom objects permissions
-        custom_objects = CustomObject.query.all()
-        for custom_obj in custom_objects:
-            can_view = f'custom_{custom_obj.id}_view' in request.form
-            can_create = f'custom_{custom_obj.id}_create' in request.form
-            can_edit = f'custom_{custom_obj.id}_edit' in request.form
-            can_delete = f'custom_{custom_obj.id}_delete' in request.form
-            
-            if can_view or can_create or can_edit or can_delete:
-                permission = PermissionSetPermission(
-                    permission_set_id=permission_set.id,
-                    object_type='custom_object',
-                    object_id=custom_obj.id,
-                    can_view=can_view,
-                    can_create=can_create,
-                    can_edit=can_edit,
-                    can_delete=can_delete
-                )
-                db.session.add(permission)
-        
+        grants = permission_form_grants(request.form, CustomObject.query.all())
+        changes = sync_permission_rows(PermissionSetPermission, PermissionSetPermission.permission_set_id, permission_set.id, grants)
+        if any(changes) or permission_set.is_active != was_active:
+            bump_permission_version()
         db.session.commit()
-        flash('Permission set updated successfully!')
+        flash(f'Permission set updated successfully! {describe_changes(changes)}')
         return redirect(url_for('permission_sets'))
     
     # Get current permissions
@@ -637,21 +3487,12 @@ def assign_permission_sets(id):
     user = User.query.get_or_404(id)
     
     if request.method == 'POST':
-        # Clear existing permission set assignments
-        UserPermissionSet.query.filter_by(user_id=user.id).delete()
-        
-        # Assign selected permission sets
-        selected_sets = request.form.getlist('permission_sets')
-        for set_id in selected_sets:
-            assignment = UserPermissionSet(
-                user_id=user.id,
-                permission_set_id=int(set_id),
-                assigned_by=current_user.id
-            )
-            db.session.add(assignment)
-        
+        selected_sets = [int(set_id) for set_id in request.form.getlist('permission_sets')]
+        changes = sync_permission_set_assignments(user.id, selected_sets, current_user.id)
+        if any(changes):
+            bump_permission_version()
         db.session.commit()
-        flash('Permission sets assigned successfully!')
+        flash(f'Permission sets assigned successfully! {describe_changes(changes)}')
         return redirect(url_for('users'))
     
     # Get available permission sets
@@ -663,6 +3504,234 @@ def assign_permission_sets(id):
     
     return render_template('assign_permission_sets.html', user=user, available_sets=available_sets, assigned_set_ids=assigned_set_ids)
 
+# Bulk user provisioning
+USER_ROLES = ('admin', 'manager', 'user')
+USER_FILE_COLUMNS = ('username', 'email', 'password', 'role')
+
+# Keys per IN (...) lookup, well under every database's bound parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+def lookup_chunks(values):
+    values = list(values)
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        yield values[start:start + LOOKUP_CHUNK_SIZE]
+
+def existing_values(column, values):
+    """The subset of values already present in column, looked up in batches."""
+    found = set()
+    for chunk in lookup_chunks(set(values)):
+        found.update(db.session.execute(db.select(column).where(column.in_(chunk))).scalars())
+    return found
+
+def validate_new_users(records):
+    """Check user records against each other and the database.
+
+    Returns (users, errors): users is a list of cleaned value dicts and errors
+    a list of {'index', 'messages'} for the records that cannot be created.
+    """
+    users, errors = [], []
+    seen_usernames, seen_emails = {}, {}
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            errors.append({'index': index, 'messages': ['record must be an object']})
+            continue
+        values = {name: str(record.get(name) or '').strip() for name in ('username', 'email', 'role')}
+        values['password'] = str(record.get('password') or '')
+        values['role'] = values['role'] or 'user'
+
+        messages = [f'{name} is required' for name in ('username', 'email', 'password') if not values[name]]
+        if values['role'] not in USER_ROLES:
+            messages.append(f"role must be one of: {', '.join(USER_ROLES)}")
+        if values['email'] and '@' not in values['email']:
+            messages.append('email must be a valid email address')
+        if values['username'] in seen_usernames:
+            messages.append(f"username repeats record {seen_usernames[values['username']]}")
+        if values['email'] in seen_emails:
+            messages.append(f"email repeats record {seen_emails[values['email']]}")
+        seen_usernames.setdefault(values['username'], index)
+        seen_emails.setdefault(values['email'], index)
+
+        if messages:
+            errors.append({'index': index, 'messages': messages})
+        else:
+            users.append((index, values))
+
+    taken_usernames = existing_values(User.username, [values['username'] for _, values in users])
+    taken_emails = existing_values(User.email, [values['email'] for _, values in users])
+    valid = []
+    for index, values in users:
+        messages = []
+        if values['username'] in taken_usernames:
+            messages.append('Username already exists')
+        if values['email'] in taken_emails:
+            messages.append('Email already exists')
+        if messages:
+            errors.append({'index': index, 'messages': messages})
+        else:
+            valid.append(values)
+    return valid, sorted(errors, key=lambda error: error['index'])
+
+def provision_users(records, hash_workers=None, hash_method=None):
+    """Create users with their default permissions in one transaction.
+
+    Nothing is written if any record is invalid. Returns (ids, errors).
+    """
+    users, errors = validate_new_users(records)
+    if errors or not users:
+        return [], errors
+
+    hashes = password_hasher.hash_many([values['password'] for values in users], hash_workers, hash_method)
+    created = db.session.execute(
+        db.insert(User).returning(User.id, User.role, sort_by_parameter_order=True),
+        [
+            {'username': values['username'], 'email': values['email'], 'password_hash': pwhash, 'role': values['role'], 'is_active': True}
+            for values, pwhash in zip(users, hashes)
+        ]
+    ).all()
+    permissions = [row for user_id, role in created for row in default_permission_rows(user_id, role)]
+    if permissions:
+        db.session.execute(db.insert(UserPermission), permissions)
+        bump_permission_version()
+    db.session.commit()
+    return [user_id for user_id, _ in created], []
+
+def missing_ids(column, ids):
+    return sorted(set(ids) - existing_values(column, ids))
+
+def bulk_assign_permission_sets(user_ids, set_ids, assigned_by):
+    """Assign every set to every user that lacks it. Returns the number of assignments added."""
+    set_ids = set(set_ids)
+    existing = set()
+    for chunk in lookup_chunks(set(user_ids)):
+        existing.update(db.session.execute(
+            db.select(UserPermissionSet.user_id, UserPermissionSet.permission_set_id)
+            .where(UserPermissionSet.user_id.in_(chunk), UserPermissionSet.permission_set_id.in_(set_ids))
+        ).all())
+    inserts = [
+        {'user_id': user_id, 'permission_set_id': set_id, 'assigned_by': assigned_by}
+        for user_id in dict.fromkeys(user_ids) for set_id in sorted(set_ids) if (user_id, set_id) not in existing
+    ]
+    if inserts:
+        db.session.execute(db.insert(UserPermissionSet), inserts)
+    return len(inserts)
+
+def bulk_unassign_permission_sets(user_ids, set_ids):
+    """Remove the sets from the users. Returns the number of assignments removed."""
+    removed = 0
+    for chunk in lookup_chunks(set(user_ids)):
+        removed += db.session.execute(
+            db.delete(UserPermissionSet)
+            .where(UserPermissionSet.user_id.in_(chunk), UserPermissionSet.permission_set_id.in_(set(set_ids)))
+        ).rowcount
+    return removed
+
+@app.route('/api/v1/users/batch', methods=['POST'])
+@api_login_required
+def api_create_users():
+    if not has_permission(current_user, 'user', permission='create'):
+        return api_error('You do not have permission to create users', 403)
+    try:
+        items = api_batch_payload('records')
+    except ValueError as e:
+        return api_error(str(e), 400)
+
+    ids, errors = provision_users(items)
+    if errors:
+        return api_error('Validation failed; no users were created', 422, errors)
+    return jsonify({'created': len(ids), 'ids': ids}), 201
+
+@app.route('/api/v1/users/permission-sets', methods=['POST', 'DELETE'])
+@api_login_required
+def api_user_permission_sets():
+    if not has_permission(current_user, 'user', permission='edit'):
+        return api_error('You do not have permission to assign permission sets', 403)
+    try:
+        user_ids = api_ids(api_batch_payload('user_ids'))
+        set_ids = api_ids(api_batch_payload('permission_set_ids'))
+    except ValueError as e:
+        return api_error(str(e), 400)
+
+    errors = [{'user_id': user_id, 'messages': ['User does not exist']} for user_id in missing_ids(User.id, user_ids)]
+    errors += [{'permission_set_id': set_id, 'messages': ['Permission set does not exist']} for set_id in missing_ids(PermissionSet.id, set_ids)]
+    if errors:
+        return api_error('Validation failed; no assignments were changed', 422, errors)
+
+    if request.method == 'POST':
+        changed = bulk_assign_permission_sets(user_ids, set_ids, current_user.id)
+        body = {'assigned': changed}
+    else:
+        changed = bulk_unassign_permission_sets(user_ids, set_ids)
+        body = {'unassigned': changed}
+    if changed:
+        bump_permission_version()
+    db.session.commit()
+    return jsonify(body)
+
+@app.cli.command('create-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(IMPORT_FORMATS), help='Input format (default: from the file extension).')
+@click.option('--hash-workers', type=int, default=os.cpu_count(), show_default=True, help='Threads hashing passwords in parallel.')
+@click.option('--hash-method', help='Werkzeug hash method for the initial passwords (default: PASSWORD_HASH_METHOD); upgraded on first login.')
+def create_users_command(path, format, hash_workers, hash_method):
+    """Create users from a CSV or NDJSON file with username, email, password and role."""
+    started = time.perf_counter()
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        try:
+            rows = list(read_import_rows(stream, format or import_format_for(path), USER_FILE_COLUMNS))
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    if not rows:
+        raise click.ClickException(f"No users found in {path}")
+
+    errors = [(row_number, [error]) for row_number, _, error in rows if error]
+    if not errors:
+        ids, validation_errors = provision_users([record for _, record, _ in rows], hash_workers, hash_method)
+        errors = [(rows[error['index']][0], error['messages']) for error in validation_errors]
+    if errors:
+        for row_number, messages in errors[:20]:
+            print(f"❌ Row {row_number}: {'; '.join(messages)}")
+        if len(errors) > 20:
+            print(f"❌ ...and {len(errors) - 20} more rows")
+        raise click.ClickException('No users were created')
+    print(f"🎉 Created {len(ids)} users in {time.perf_counter() - started:.1f}s")
+
+@app.cli.command('assign-permission-sets')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--set', 'sets', multiple=True, required=True, help='Permission set id or name; repeat for several.')
+@click.option('--unassign', is_flag=True, help='Remove the sets instead of assigning them.')
+@click.option('--assigned-by', default='admin', show_default=True, help='Username recorded as assigning the sets.')
+def assign_permission_sets_command(path, sets, unassign, assigned_by):
+    """Assign (or --unassign) permission sets for every username listed in a file, one per line."""
+    with open(path, encoding='utf-8-sig') as stream:
+        usernames = list(dict.fromkeys(line.strip() for line in stream if line.strip()))
+
+    user_ids = {}
+    for chunk in lookup_chunks(usernames):
+        user_ids.update(db.session.execute(db.select(User.username, User.id).where(User.username.in_(chunk))).all())
+    unknown = [username for username in usernames if username not in user_ids]
+    if unknown:
+        raise click.ClickException(f"Unknown users: {', '.join(unknown[:20])}{' ...' if len(unknown) > 20 else ''}")
+
+    set_ids = []
+    for value in sets:
+        condition = PermissionSet.id == int(value) if value.isdigit() else PermissionSet.name == value
+        set_id = db.session.execute(db.select(PermissionSet.id).where(condition)).scalar()
+        if set_id is None:
+            raise click.ClickException(f"Unknown permission set: {value}")
+        set_ids.append(set_id)
+
+    if unassign:
+        changed = bulk_unassign_permission_sets(list(user_ids.values()), set_ids)
+    else:
+        assigner = User.query.filter_by(username=assigned_by).first()
+        if assigner is None:
+            raise click.ClickException(f"Unknown user: {assigned_by}")
+        changed = bulk_assign_permission_sets(list(user_ids.values()), set_ids, assigner.id)
+    if changed:
+        bump_permission_version()
+    db.session.commit()
+    print(f"✅ {'Removed' if unassign else 'Added'} {changed} assignments across {len(user_ids)} users")
+
 # Contact routes
 @app.route('/contacts')
 @login_required
@@ -671,8 +3740,8 @@ def contacts():
         flash('You do not have permission to view contacts.')
         return redirect(url_for('dashboard'))
     
-    contacts = Contact.query.all()
-    return render_template('contacts.html', contacts=contacts)
+    page = paginate_list(Contact, 'contact')
+    return render_template('contacts.html', contacts=page.items, page=page)
 
 @app.route('/contacts/new', methods=['GET', 'POST'])
 @login_required
@@ -729,8 +3798,8 @@ def delete_contact(id):
 @app.route('/accounts')
 @login_required
 def accounts():
-    accounts = Account.query.all()
-    return render_template('accounts.html', accounts=accounts)
+    page = paginate_list(Account, 'account')
+    return render_template('accounts.html', accounts=page.items, page=page)
 
 @app.route('/accounts/new', methods=['GET', 'POST'])
 @login_required
@@ -783,8 +3852,10 @@ def delete_account(id):
 @app.route('/opportunities')
 @login_required
 def opportunities():
-    opportunities = Opportunity.query.all()
-    return render_template('opportunities.html', opportunities=opportunities)
+    # Account and contact names come back in the same query as the page
+    query = Opportunity.query.options(db.joinedload(Opportunity.account), db.joinedload(Opportunity.contact))
+    page = paginate_list(Opportunity, 'opportunity', query=query)
+    return render_template('opportunities.html', opportunities=page.items, page=page)
 
 @app.route('/opportunities/new', methods=['GET', 'POST'])
 @login_required
@@ -805,9 +3876,7 @@ def new_opportunity():
         flash('Opportunity created successfully!')
         return redirect(url_for('opportunities'))
     
-    accounts = Account.query.all()
-    contacts = Contact.query.all()
-    return render_template('opportunity_form.html', accounts=accounts, contacts=contacts)
+    return render_template('opportunity_form.html')
 
 @app.route('/opportunities/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -826,9 +3895,20 @@ def edit_opportunity(id):
         flash('Opportunity updated successfully!')
         return redirect(url_for('opportunities'))
     
-    accounts = Account.query.all()
-    contacts = Contact.query.all()
-    return render_template('opportunity_form.html', opportunity=opportunity, accounts=accounts, contacts=contacts)
+    return render_template('opportunity_form.html', opportunity=opportunity)
+
+@app.route('/typeahead/<object_type>')
+@login_required
+def typeahead(object_type):
+    if object_type not in TYPEAHEAD_SOURCES or not has_permission(current_user, object_type, permission='view'):
+        return jsonify({'results': []}), 404
+    
+    search = request.args.get('q', '').strip().lower()
+    if not search:
+        return jsonify({'results': []})
+    limit = max(1, min(request.args.get('limit', app.config['TYPEAHEAD_LIMIT'], type=int), 50))
+    results = TYPEAHEAD_SOURCES[object_type](search, limit)
+    return jsonify({'results': [{'id': id, 'label': label} for id, label in results]})
 
 @app.route('/opportunities/<int:id>/delete')
 @login_required
@@ -843,8 +3923,8 @@ def delete_opportunity(id):
 @app.route('/leads')
 @login_required
 def leads():
-    leads = Lead.query.all()
-    return render_template('leads.html', leads=leads)
+    page = paginate_list(Lead, 'lead')
+    return render_template('leads.html', leads=page.items, page=page)
 
 @app.route('/leads/new', methods=['GET', 'POST'])
 @login_required
@@ -936,21 +4016,29 @@ def new_custom_object():
 @login_required
 def custom_records(id):
     custom_object = CustomObject.query.get_or_404(id)
-    records = CustomRecord.query.filter_by(object_id=id).all()
-    fields = safe_json_load(custom_object.fields)
-    return render_template('custom_records.html', custom_object=custom_object, records=records, fields=fields)
+    fields = get_custom_schema(custom_object).fields
+    page = paginate_custom_records(id, fields, request.args)
+    return render_template('custom_records.html', custom_object=custom_object, records=page.items, fields=fields,
+                           page=page, filters=page.extra_args)
 
 @app.route('/custom-objects/<int:id>/records/new', methods=['GET', 'POST'])
 @login_required
 def new_custom_record(id):
     custom_object = CustomObject.query.get_or_404(id)
-    fields = safe_json_load(custom_object.fields)
+    schema = get_custom_schema(custom_object)
+    fields = schema.fields
     
     if request.method == 'POST':
         data = {}
         for field in fields:
             data[field['name']] = request.form.get(field['name'], '')
         
+        errors = schema.validate(data)
+        if errors:
+            for error in errors:
+                flash(error)
+            return render_template('custom_record_form.html', custom_object=custom_object, fields=fields, data=data)
+        
         record = CustomRecord(
             object_id=id,
             data=json.dumps(data)
@@ -962,6 +4050,193 @@ def new_custom_record(id):
     
     return render_template('custom_record_form.html', custom_object=custom_object, fields=fields)
 
+# Export routes
+@app.route('/export/<object_type>')
+@login_required
+def export_object(object_type):
+    format = request.args.get('format', 'csv')
+    if object_type not in EXPORT_MODELS or format not in EXPORT_FORMATS:
+        abort(404)
+    if not has_permission(current_user, object_type, permission='view'):
+        flash(f'You do not have permission to export {object_type} records.')
+        return redirect(url_for('dashboard'))
+    return export_response(export_records(object_type, format), object_type, format)
+
+@app.route('/custom-objects/<int:id>/records/export')
+@login_required
+def export_custom_object(id):
+    custom_object = CustomObject.query.get_or_404(id)
+    format = request.args.get('format', 'csv')
+    if format not in EXPORT_FORMATS:
+        abort(404)
+    if not has_permission(current_user, 'custom_object', custom_object.id, 'view'):
+        flash('You do not have permission to export custom records.')
+        return redirect(url_for('dashboard'))
+    return export_response(export_custom_records(custom_object, format), custom_object.name, format)
+
+# JSON API routes
+@app.route('/api/v1/<resource>', methods=['GET', 'POST', 'PATCH', 'DELETE'])
+@api_login_required
+def api_records(resource):
+    if resource not in API_RESOURCES:
+        return api_error(f"Unknown resource {resource}", 404)
+    return api_dispatch(ApiCollection(API_RESOURCES[resource]), API_METHOD_OPERATIONS[request.method])
+
+@app.route('/api/v1/<resource>/batch')
+@api_login_required
+def api_records_batch(resource):
+    if resource not in API_RESOURCES:
+        return api_error(f"Unknown resource {resource}", 404)
+    return api_dispatch(ApiCollection(API_RESOURCES[resource]), 'batch_get')
+
+@app.route('/api/v1/<resource>/<int:id>')
+@api_login_required
+def api_record(resource, id):
+    if resource not in API_RESOURCES:
+        return api_error(f"Unknown resource {resource}", 404)
+    return api_get_one(ApiCollection(API_RESOURCES[resource]), id)
+
+@app.route('/api/v1/custom-objects/<int:object_id>/records', methods=['GET', 'POST', 'PATCH', 'DELETE'])
+@api_login_required
+def api_custom_records(object_id):
+    custom_object = db.session.get(CustomObject, object_id)
+    if custom_object is None:
+        return api_error(f"Custom object {object_id} does not exist", 404)
+    return api_dispatch(CustomRecordCollection(custom_object), API_METHOD_OPERATIONS[request.method])
+
+@app.route('/api/v1/custom-objects/<int:object_id>/records/batch')
+@api_login_required
+def api_custom_records_batch(object_id):
+    custom_object = db.session.get(CustomObject, object_id)
+    if custom_object is None:
+        return api_error(f"Custom object {object_id} does not exist", 404)
+    return api_dispatch(CustomRecordCollection(custom_object), 'batch_get')
+
+@app.route('/api/v1/custom-objects/<int:object_id>/records/<int:id>')
+@api_login_required
+def api_custom_record(object_id, id):
+    custom_object = db.session.get(CustomObject, object_id)
+    if custom_object is None:
+        return api_error(f"Custom object {object_id} does not exist", 404)
+    return api_get_one(CustomRecordCollection(custom_object), id)
+
+# Autocomplete routes
+@app.route('/autocomplete')
+@login_required
+def autocomplete():
+    object_types = {object_type for object_type in AUTOCOMPLETE_MODELS if has_permission(current_user, object_type, permission='view')}
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    entries = get_autocomplete_index().search(request.args.get('q', ''), object_types, limit) if object_types else []
+    return jsonify({'results': [
+        {
+            'object_type': object_type,
+            'id': id,
+            'label': label,
+            'detail': detail,
+            'url': url_for(SEARCH_ENDPOINTS[object_type], id=id)
+        }
+        for object_type, id, label, detail, _ in entries
+    ]})
+
+@app.route('/autocomplete/stats')
+@login_required
+def autocomplete_stats():
+    if current_user.role != 'admin':
+        abort(403)
+    return jsonify(autocomplete_index.memory_report(app.config['AUTOCOMPLETE_MEMORY_BUDGET_MB'] * 1024 * 1024))
+
+@app.route('/db/pool-stats')
+@login_required
+def db_pool_stats():
+    if current_user.role != 'admin':
+        abort(403)
+    return jsonify(pool_stats())
+
+# Search routes
+@app.route('/search')
+@login_required
+def search():
+    query = request.args.get('q', '').strip()
+    page = max(1, request.args.get('page', 1, type=int))
+    object_types = [object_type for object_type in SEARCH_MODELS if has_permission(current_user, object_type, permission='view')]
+    hits, has_next = search_documents(query, object_types, page, app.config['SEARCH_PAGE_SIZE'])
+    return render_template('search.html', query=query, hits=hits, page=page, has_next=has_next, endpoints=SEARCH_ENDPOINTS)
+
+@app.route('/api/v1/search')
+@api_login_required
+def api_search():
+    query = request.args.get('q', '').strip()
+    page = max(1, request.args.get('page', 1, type=int))
+    object_types = [object_type for object_type in SEARCH_MODELS if has_permission(current_user, object_type, permission='view')]
+    hits, has_next = search_documents(query, object_types, page, app.config['SEARCH_PAGE_SIZE'])
+    return jsonify({
+        'hits': [
+            {'object_type': hit.object_type, 'id': hit.object_id, 'title': hit.title, 'body': hit.body}
+            for hit in hits
+        ],
+        'page': page,
+        'has_next': has_next
+    })
+
+# Import routes
+@app.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_records():
+    jobs = ImportJob.query
+    if current_user.role != 'admin':
+        jobs = jobs.filter_by(created_by=current_user.id)
+    jobs = jobs.order_by(ImportJob.id.desc()).limit(20).all()
+    
+    if request.method == 'POST':
+        object_type = request.form.get('object_type')
+        upload = request.files.get('file')
+        if object_type not in IMPORT_MODELS or not upload or not upload.filename:
+            flash('Choose an object type and a file to import.')
+            return redirect(url_for('import_records'))
+        if not has_permission(current_user, object_type, permission='create'):
+            flash(f'You do not have permission to create {object_type} records.')
+            return redirect(url_for('import_records'))
+        
+        resume_id = request.form.get('resume_id', type=int)
+        if resume_id:
+            job = next((job for job in jobs if job.id == resume_id), None)
+            if job is None or job.object_type != object_type or job.status == 'completed':
+                flash('That import job cannot be resumed.')
+                return redirect(url_for('import_records'))
+        else:
+            job = ImportJob(
+                object_type=object_type,
+                filename=upload.filename,
+                format=request.form.get('format') if request.form.get('format') in IMPORT_FORMATS else import_format_for(upload.filename),
+                created_by=current_user.id
+            )
+            db.session.add(job)
+            db.session.commit()
+        
+        run_import(job, io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''))
+        if job.status == 'completed':
+            flash(f'Import #{job.id} complete: {job.inserted} inserted, {job.failed} rejected.')
+        else:
+            flash(f'Import #{job.id} stopped after row {job.rows_processed}: {job.message}. Upload the same file to resume it.')
+        return redirect(url_for('import_records'))
+    
+    object_types = [object_type for object_type in IMPORT_MODELS if has_permission(current_user, object_type, permission='create')]
+    return render_template('import.html', jobs=jobs, object_types=object_types, columns={
+        object_type: list(import_columns(model)) for object_type, model in IMPORT_MODELS.items()
+    })
+
+@app.route('/import/<int:id>/errors')
+@login_required
+def import_errors(id):
+    job = ImportJob.query.get_or_404(id)
+    if current_user.role != 'admin' and job.created_by != current_user.id:
+        abort(404)
+    return Response(
+        stream_with_context(import_error_report(job.id)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=import-{job.id}-errors.csv'}
+    )
+
 def initialize_database():
     """Initialize the database with tables and sample data."""
     print("🗄️  Initializing Simple CRM Database...")
@@ -970,13 +4245,14 @@ def initialize_database():
         # Create all tables (don't drop on Heroku to preserve data)
         print("🏗️  Creating database tables...")
         db.create_all()
+        ensure_search_index()
         
         # Create admin user
         print("👤 Creating admin user...")
         admin = User(
             username='admin',
             email='admin@crm.com',
-            password_hash=generate_password_hash('admin123'),
+            password_hash=password_hasher.hash('admin123'),
             role='admin'
         )
         db.session.add(admin)
@@ -985,9 +4261,9 @@ def initialize_database():
         # Create sample users
         print("👥 Creating sample users...")
         users = [
-            User(username='manager1', email='manager1@crm.com', password_hash=generate_password_hash('manager123'), role='manager'),
-            User(username='user1', email='user1@crm.com', password_hash=generate_password_hash('user123'), role='user'),
-            User(username='user2', email='user2@crm.com', password_hash=generate_password_hash('user123'), role='user')
+            User(username='manager1', email='manager1@crm.com', password_hash=password_hasher.hash('manager123'), role='manager'),
+            User(username='user1', email='user1@crm.com', password_hash=password_hasher.hash('user123'), role='user'),
+            User(username='user2', email='user2@crm.com', password_hash=password_hasher.hash('user123'), role='user')
         ]
         db.session.add_all(users)
         db.session.commit()
@@ -1177,6 +4453,7 @@ def initialize_database():
         ]
         db.session.add_all(support_permissions)
         
+        bump_permission_version()
         db.session.commit()
         print("✅ Created 3 sample permission sets (Sales Team, Marketing Team, Support Team)")
         
@@ -1191,33 +4468,130 @@ def initialize_database():
         print("   Username: admin")
         print("   Password: admin123")
 
-# Initialize database when module is imported
+def existing_index_names(connection, inspector, table_name):
+    """Return the names of the indexes a table already has."""
+    if connection.dialect.name == 'sqlite':
+        # SQLite reflection skips expression indexes such as lower(name); read the catalog directly
+        return set(connection.execute(
+            db.text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+            {'table': table_name}
+        ).scalars())
+    return {index['name'] for index in inspector.get_indexes(table_name)}
+
+def widen_password_hash_column():
+    """Widen user.password_hash on databases created when it held 120 characters (too short for scrypt)."""
+    if db.engine.dialect.name != 'postgresql':
+        return  # SQLite does not enforce VARCHAR lengths
+    column = next(column for column in db.inspect(db.engine).get_columns('user') if column['name'] == 'password_hash')
+    if (column['type'].length or 255) < 255:
+        with db.engine.begin() as connection:
+            connection.execute(db.text('ALTER TABLE "user" ALTER COLUMN password_hash TYPE VARCHAR(255)'))
+
+def ensure_indexes():
+    """Create every declared index that is missing from an existing database.
+
+    Safe to run repeatedly. On PostgreSQL indexes are built CONCURRENTLY so
+    large tables stay writable while the migration runs.
+    """
+    created = []
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    concurrently = db.engine.dialect.name == 'postgresql'
+
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing = existing_index_names(connection, inspector, table.name)
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name in existing:
+                    continue
+
+                if concurrently:
+                    index.dialect_options['postgresql']['concurrently'] = True
+                try:
+                    connection.execute(db.schema.CreateIndex(index, if_not_exists=True))
+                finally:
+                    if concurrently:
+                        index.dialect_options['postgresql']['concurrently'] = False
+                created.append(index.name)
+    return created
+
+def init_schema():
+    """Create missing tables, indexes, the search index and the record counters. Safe to run repeatedly."""
+    db.create_all()
+    widen_password_hash_column()
+    created = ensure_indexes()
+    ensure_search_index()
+    if ensure_counters():
+        print("✅ Built record counters")
+    return created
+
+def seed_database():
+    """Create the admin user and sample data unless the admin already exists."""
+    if User.query.filter_by(username='admin').first():
+        print("✅ Database already initialized.")
+        return False
+    print("🔧 Admin user not found. Initializing database...")
+    initialize_database()
+    return True
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create missing tables and indexes on a new or existing database."""
+    created = init_schema()
+    for name in created:
+        print(f"✅ Created index {name}")
+    print(f"🎉 Schema ready ({len(created)} indexes created)")
+
+# Older deployments run migrate-db; it does the same work as init-db
+app.cli.add_command(init_db_command, 'migrate-db')
+
+@app.cli.command('seed-db')
+def seed_db_command():
+    """Create the admin user and sample data on an empty database."""
+    seed_database()
+
 def init_app():
-    """Initialize the application and database"""
+    """Create the schema and seed an empty database."""
     with app.app_context():
-        try:
-            # Check if admin user exists
-            admin_exists = User.query.filter_by(username='admin').first()
-            if not admin_exists:
-                print("🔧 Admin user not found. Initializing database...")
-                initialize_database()
-            else:
-                print("✅ Database already initialized.")
-        except Exception as e:
-            print(f"⚠️  Database initialization error: {e}")
-            print("🔄 Attempting to create tables...")
-            try:
-                db.create_all()
-                initialize_database()
-            except Exception as e2:
-                print(f"❌ Failed to initialize database: {e2}")
-
-# Initialize when module is imported
-try:
-    init_app()
-except Exception as e:
-    print(f"⚠️  Initialization warning: {e}")
-    print("🔄 Will retry on first request...")
+        init_schema()
+        seed_database()
+
+# Settings applied when this module is imported, which create_app() cannot change
+IMPORT_TIME_SETTINGS = ('SQLALCHEMY_DATABASE_URI', 'SQLALCHEMY_ENGINE_OPTIONS', 'SQLALCHEMY_BINDS', 'TRUSTED_PROXY_COUNT')
+
+def create_app(config=None):
+    """Return the application, applying optional configuration overrides.
+
+    This is not an isolating factory: there is one module-level app, every
+    call configures and returns that same object, and its engine and proxy
+    settings are fixed at import from DATABASE_URL and TRUSTED_PROXY_COUNT
+    in the environment. Overriding those here raises ValueError.
+
+    Models, routes and CLI commands are registered when this module is
+    imported, and neither that nor this function touches the database: run
+    `flask init-db` and `flask seed-db` once per deploy, or set AUTO_INIT_DB
+    to do both here.
+    """
+    if config:
+        fixed = [key for key in IMPORT_TIME_SETTINGS if key in config and config[key] != app.config.get(key)]
+        if fixed:
+            raise ValueError(f"{', '.join(fixed)} cannot be changed after import; set them in the environment instead")
+        app.config.update(config)
+
+    # Caches are built at import; resize them to the final configuration
+    permission_cache.maxsize = app.config['PERMISSION_CACHE_SIZE']
+    custom_schema_cache.maxsize = app.config['CUSTOM_SCHEMA_CACHE_SIZE']
+    dashboard_cache.ttl = app.config['DASHBOARD_CACHE_TTL']
+    identity_cache.ttl = app.config['IDENTITY_CACHE_TTL']
+    identity_cache.maxsize = app.config['IDENTITY_CACHE_SIZE']
+    autocomplete_index.max_age = app.config['AUTOCOMPLETE_MAX_AGE']
+
+    if app.config['AUTO_INIT_DB']:
+        init_app()
+    return app
 
 if __name__ == '__main__':
     print("\n🚀 Starting Simple CRM System...")
@@ -1226,4 +4600,4 @@ if __name__ == '__main__':
     print("🛑 Press Ctrl+C to stop the server")
     print("-" * 50)
     
-    app.run(debug=True) 
\ No newline at end of file
+    create_app({'AUTO_INIT_DB': True}).run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Index Benchmark for Simple CRM
+This script loads a synthetic data set into a scratch database and prints the
+query plan and timing of the hot queries with and without the declared indexes.
+
+Usage:
+    python benchmark_indexes.py [rows]
+
+Set DATABASE_URL to benchmark against PostgreSQL; otherwise a temporary SQLite
+file is used. The target database is dropped and recreated.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import random
+from datetime import datetime, timedelta
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+if not os.environ.get('DATABASE_URL'):
+    scratch_dir = tempfile.mkdtemp(prefix='crm-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(scratch_dir, 'bench.db')
+
+from app import app, db, ensure_indexes, permission_grants_query
+from app import User, Contact, Account, Opportunity, Lead, CustomObject, CustomRecord
+from app import PermissionSet, PermissionSetPermission, UserPermission, UserPermissionSet
+
+REPEAT = 20
+
+def load_data(rows):
+    """Bulk load a synthetic data set."""
+    random.seed(42)
+    start = datetime(2020, 1, 1)
+
+    def created(i):
+        return start + timedelta(minutes=i)
+
+    db.drop_all()
+    db.create_all()
+
+    db.session.execute(db.insert(User), [
+        {'username': f'user{i}', 'email': f'user{i}@crm.com', 'password_hash': 'x', 'role': 'user'}
+        for i in range(1, 1001)
+    ])
+    db.session.execute(db.insert(PermissionSet), [
+        {'name': f'Set {i}', 'is_active': True} for i in range(1, 51)
+    ])
+    db.session.execute(db.insert(PermissionSetPermission), [
+        {'permission_set_id': set_id, 'object_type': object_type, 'can_view': True}
+        for set_id in range(1, 51)
+        for object_type in ('contact', 'account', 'opportunity', 'lead')
+    ])
+    db.session.execute(db.insert(UserPermission), [
+        {'user_id': user_id, 'object_type': object_type, 'can_view': True}
+        for user_id in range(1, 1001)
+        for object_type in ('contact', 'account', 'opportunity', 'lead')
+    ])
+    db.session.execute(db.insert(UserPermissionSet), [
+        {'user_id': user_id, 'permission_set_id': random.randint(1, 50), 'assigned_by': 1}
+        for user_id in range(1, 1001)
+        for _ in range(3)
+    ])
+
+    db.session.execute(db.insert(Account), [
+        {'name': f'Account {i}', 'created_at': created(i)} for i in range(rows // 10)
+    ])
+    db.session.execute(db.insert(Contact), [
+        {'first_name': f'First{i % 997}', 'last_name': f'Last{i % 991}', 'created_at': created(i)}
+        for i in range(rows)
+    ])
+    db.session.execute(db.insert(Opportunity), [
+        {
+            'name': f'Opportunity {i}',
+            'account_id': random.randint(1, rows // 10),
+            'contact_id': random.randint(1, rows),
+            'stage': random.choice(['Prospecting', 'Qualification', 'Proposal', 'Negotiation', 'Closed Won']),
+            'close_date': (start + timedelta(days=i % 1000)).date(),
+            'created_at': created(i)
+        }
+        for i in range(rows)
+    ])
+    db.session.execute(db.insert(Lead), [
+        {
+            'first_name': f'First{i % 997}',
+            'last_name': f'Last{i % 991}',
+            'status': random.choice(['New', 'Contacted', 'Qualified', 'Unqualified', 'Converted']),
+            'created_at': created(i)
+        }
+        for i in range(rows)
+    ])
+    db.session.execute(db.insert(CustomObject), [
+        {'name': f'Object{i}', 'label': f'Object {i}', 'fields': '[]', 'created_at': created(i)}
+        for i in range(1, 21)
+    ])
+    db.session.execute(db.insert(CustomRecord), [
+        {'object_id': random.randint(1, 20), 'data': '{}', 'created_at': created(i)}
+        for i in range(rows)
+    ])
+    db.session.commit()
+
+def hot_queries(rows):
+    """Return the statements issued by the hot paths, keyed by a short label."""
+    boundary = datetime(2020, 1, 1) + timedelta(minutes=rows - 500)
+    return {
+        'permission matrix': permission_grants_query(500),
+        'dashboard recent contacts': db.select(Contact).order_by(Contact.created_at.desc()).limit(5),
+        'dashboard recent opportunities': db.select(Opportunity).order_by(Opportunity.created_at.desc()).limit(5),
+        'contacts deep keyset page': db.select(Contact).where(
+            db.tuple_(Contact.created_at, Contact.id) > db.tuple_(
+                db.literal(boundary, Contact.created_at.type), db.literal(rows - 500, Contact.id.type)
+            )
+        ).order_by(Contact.created_at, Contact.id).limit(50),
+        'custom records by object': db.select(CustomRecord).where(
+            CustomRecord.object_id == 7
+        ).order_by(CustomRecord.created_at, CustomRecord.id).limit(50),
+        'opportunities by account': db.select(Opportunity).where(Opportunity.account_id == 42),
+        'opportunities by stage': db.select(Opportunity).where(Opportunity.stage == 'Proposal').limit(50),
+        'leads by status': db.select(Lead).where(Lead.status == 'Qualified').limit(50)
+    }
+
+def explain(statement):
+    """Return the database's query plan for a statement as text."""
+    sql = str(statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    if db.engine.dialect.name == 'sqlite':
+        rows = db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql)).all()
+        return '\n'.join(f'      {row[-1]}' for row in rows)
+    rows = db.session.execute(db.text('EXPLAIN ' + sql)).all()
+    return '\n'.join(f'      {row[0]}' for row in rows)
+
+def time_query(statement):
+    """Return the median wall time of a statement in milliseconds."""
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        db.session.execute(statement).all()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+def drop_declared_indexes():
+    """Drop every declared index so the baseline matches the old schema."""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            db.session.execute(db.text(f'DROP INDEX IF EXISTS {index.name}'))
+    db.session.commit()
+
+def analyze():
+    """Refresh planner statistics."""
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+def run_pass(label, rows):
+    print(f"\n📋 {label}")
+    results = {}
+    for name, statement in hot_queries(rows).items():
+        results[name] = time_query(statement)
+        print(f"   • {name}: {results[name]:.2f} ms")
+        print(explain(statement))
+    return results
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    with app.app_context():
+        print(f"🗄️  Benchmarking indexes on {db.engine.url.render_as_string(hide_password=True)} with {rows} rows per table")
+        load_data(rows)
+
+        drop_declared_indexes()
+        analyze()
+        before = run_pass('Without indexes', rows)
+
+        created = ensure_indexes()
+        analyze()
+        after = run_pass(f'With indexes ({len(created)} created)', rows)
+
+        print("\n📊 Summary (median ms, before → after)")
+        for name in before:
+            speedup = before[name] / after[name] if after[name] else float('inf')
+            print(f"   • {name}: {before[name]:.2f} → {after[name]:.2f} ({speedup:.1f}x)")
+
+if __name__ == '__main__':
+    main()
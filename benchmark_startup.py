@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark for Simple CRM
+This script starts several worker processes at once, the way gunicorn does,
+and prints how long each one takes from importing the app to answering its
+first request.
+
+Usage:
+    python benchmark_startup.py [workers]
+
+Set DATABASE_URL to benchmark against PostgreSQL; otherwise a temporary SQLite
+file is created and seeded first.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in each worker process; prints one JSON line of timings in milliseconds
+WORKER = """
+import json, time
+started = time.perf_counter()
+from app import create_app
+app = create_app()
+imported = time.perf_counter()
+response = app.test_client().get('/login')
+answered = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (answered - imported) * 1000,
+    'total_ms': (answered - started) * 1000,
+    'status': response.status_code
+}))
+"""
+
+def run_workers(count, env):
+    """Start count workers at once and return their timings."""
+    workers = [
+        subprocess.Popen([sys.executable, '-c', WORKER], cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+        for _ in range(count)
+    ]
+    results = []
+    for worker in workers:
+        output, _ = worker.communicate()
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    env = dict(os.environ)
+
+    if not env.get('DATABASE_URL'):
+        scratch_dir = tempfile.mkdtemp(prefix='crm-startup-')
+        env['DATABASE_URL'] = 'sqlite:///' + os.path.join(scratch_dir, 'startup.db')
+        print("🗄️  Seeding a scratch database...")
+        subprocess.run([sys.executable, '-c', 'from app import init_app; init_app()'], cwd=ROOT, env=env,
+                       check=True, stdout=subprocess.DEVNULL)
+
+    print(f"🚀 Starting {count} workers at once")
+    results = run_workers(count, env)
+    for number, result in enumerate(results, start=1):
+        print(f"   • worker {number}: import {result['import_ms']:.0f} ms, "
+              f"first request {result['first_request_ms']:.0f} ms (HTTP {result['status']}), "
+              f"total {result['total_ms']:.0f} ms")
+
+    print("\n📊 Median per worker")
+    for key, label in (('import_ms', 'import'), ('first_request_ms', 'first request'), ('total_ms', 'total')):
+        print(f"   • {label}: {median([result[key] for result in results]):.0f} ms")
+
+if __name__ == '__main__':
+    main()
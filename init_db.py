@@ -12,7 +12,7 @@ from datetime import datetime
 # Add the current directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import app, db, User, Contact, Account, Opportunity, Lead, CustomObject, CustomRecord
+from app import app, db, ensure_search_index, User, Contact, Account, Opportunity, Lead, CustomObject, CustomRecord
 from werkzeug.security import generate_password_hash
 
 def init_database():
@@ -27,6 +27,7 @@ def init_database():
         # Create all tables
         print("🏗️  Creating database tables...")
         db.create_all()
+        ensure_search_index()
         
         # Create admin user
         print("👤 Creating admin user...")
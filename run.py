@@ -10,8 +10,7 @@ import sys
 # Add the current directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-# Import the app - this will trigger the initialization in app.py
-from app import app
+from app import create_app
 
 if __name__ == '__main__':
     print("🚀 Starting Simple CRM System via run.py...")
@@ -21,6 +20,8 @@ if __name__ == '__main__':
     print("-" * 50)
     
     try:
+        # Create and seed the local database on first run
+        app = create_app({'AUTO_INIT_DB': True})
         app.run(debug=True, host='0.0.0.0', port=5000)
     except KeyboardInterrupt:
         print("\n👋 CRM System stopped. Goodbye!")
@@ -11,6 +11,28 @@ import json
 # Add the current directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+def create_probe_admin(username):
+    """Create an admin user a test can sign in as with password 'secret'; returns its id."""
+    from werkzeug.security import generate_password_hash
+    from app import app, db, User, init_schema
+
+    with app.app_context():
+        init_schema()
+        user = User(username=username, email=f'{username}@crm.com', role='admin',
+                    password_hash=generate_password_hash('secret', 'pbkdf2:sha256:1000'))
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+def delete_probe_user(user_id):
+    """Remove a user created by create_probe_admin."""
+    from app import app, db, User
+
+    with app.app_context():
+        db.session.rollback()
+        db.session.execute(db.delete(User).where(User.id == user_id))
+        db.session.commit()
+
 def test_imports():
     """Test if all required modules can be imported."""
     print("🧪 Testing imports...")
@@ -96,6 +118,1060 @@ def test_templates():
         print(f"❌ Template test failed: {e}")
         return False
 
+def test_permission_matrix():
+    """Test that direct grants win over permission sets in the compiled matrix."""
+    print("🧪 Testing permission matrix...")
+
+    try:
+        from app import app, db, User, PermissionSet, PermissionSetPermission
+        from app import UserPermission, UserPermissionSet, has_permission
+
+        with app.test_request_context():
+            db.create_all()
+
+            user = User(username='matrix_test', email='matrix_test@crm.com', password_hash='x', role='user')
+            permission_set = PermissionSet(name='Matrix Test', is_active=True)
+            db.session.add_all([user, permission_set])
+            db.session.flush()
+
+            db.session.add_all([
+                UserPermission(user_id=user.id, object_type='contact', can_view=True, can_edit=False),
+                UserPermissionSet(user_id=user.id, permission_set_id=permission_set.id, assigned_by=user.id),
+                PermissionSetPermission(permission_set_id=permission_set.id, object_type='contact', can_view=True, can_edit=True),
+                PermissionSetPermission(permission_set_id=permission_set.id, object_type='lead', can_view=True, can_create=True)
+            ])
+            db.session.flush()
+
+            assert has_permission(user, 'contact', permission='view')
+            assert not has_permission(user, 'contact', permission='edit')
+            assert has_permission(user, 'lead', permission='create')
+            assert not has_permission(user, 'lead', permission='delete')
+            assert not has_permission(user, 'account', permission='view')
+
+            db.session.rollback()
+
+        print("✅ Permission matrix working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Permission matrix test failed: {e}")
+        return False
+
+def test_permission_cache():
+    """Test the LRU cache bounds and permission version invalidation."""
+    print("🧪 Testing permission cache...")
+
+    try:
+        from app import app, db, User, UserPermission, LRUCache
+        from app import has_permission, bump_permission_version, permission_cache
+
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.get('a') == 1
+        cache.set('c', 3)
+        assert cache.get('b') is None
+        stats = cache.stats()
+        assert stats['size'] == 2 and stats['evictions'] == 1
+        assert stats['hits'] == 1 and stats['misses'] == 1
+
+        with app.test_request_context():
+            db.create_all()
+
+            user = User(username='cache_test', email='cache_test@crm.com', password_hash='x', role='user')
+            db.session.add(user)
+            db.session.flush()
+            grant = UserPermission(user_id=user.id, object_type='contact', can_view=True, can_edit=False)
+            db.session.add(grant)
+            db.session.flush()
+
+            assert not has_permission(user, 'contact', permission='edit')
+
+            grant.can_edit = True
+            bump_permission_version()
+            db.session.flush()
+            assert has_permission(user, 'contact', permission='edit')
+
+            # The bump is rolled back, so drop the matrix cached under its version
+            db.session.rollback()
+            permission_cache.clear()
+
+        print("✅ Permission cache working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Permission cache test failed: {e}")
+        return False
+
+def test_keyset_cursor():
+    """Test that list view cursors round-trip their sort position."""
+    print("🧪 Testing keyset pagination cursors...")
+
+    try:
+        from datetime import datetime
+        from app import Contact, encode_cursor, decode_cursor
+
+        created_at = datetime(2024, 5, 1, 12, 30)
+        token = encode_cursor(created_at, 42, 'next')
+        assert decode_cursor(token, Contact.created_at) == (created_at, 42, 'next')
+
+        token = encode_cursor('Smith', 7, 'prev')
+        assert decode_cursor(token, Contact.last_name) == ('Smith', 7, 'prev')
+
+        assert decode_cursor('not-a-cursor', Contact.created_at) is None
+
+        print("✅ Keyset pagination cursors working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Keyset cursor test failed: {e}")
+        return False
+
+def test_dashboard_cache():
+    """Test that dashboard counts come from one query and writes invalidate the cache."""
+    print("🧪 Testing dashboard cache...")
+
+    try:
+        from app import (app, db, Contact, RecordCounter, adjust_counter, aggregate_counts, dashboard_cache,
+                         dashboard_counts, get_dashboard_payload)
+
+        with app.app_context():
+            db.create_all()
+            dashboard_cache.clear()
+
+            payload = get_dashboard_payload()
+            assert payload['contacts_count'] == dashboard_counts()['contact']
+            assert dashboard_cache.get('dashboard') is payload
+
+            db.session.add(Contact(first_name='Cache', last_name='Test'))
+            db.session.commit()
+            assert dashboard_cache.get('dashboard') is None
+            assert get_dashboard_payload()['contacts_count'] == payload['contacts_count'] + 1
+
+            db.session.delete(Contact.query.filter_by(first_name='Cache', last_name='Test').first())
+            db.session.commit()
+
+            # Another transaction seeds a new counter first: our delta lands on top of it
+            import app as crm
+
+            def count_rows(connection, object_type, object_id):
+                connection.execute(db.insert(RecordCounter).values(object_type=object_type, object_id=object_id, count=7))
+                return 1
+
+            saved_count_rows, crm.count_rows = crm.count_rows, count_rows
+            try:
+                adjust_counter(db.session.connection(), 'custom_record', -1, 1)
+            finally:
+                crm.count_rows = saved_count_rows
+            assert RecordCounter.query.filter_by(object_type='custom_record', object_id=-1).one().count == 8
+            db.session.rollback()
+
+            # Without counters the dashboard counts the tables and writes nothing
+            db.session.execute(db.delete(RecordCounter))
+            assert dashboard_counts() == aggregate_counts()
+            assert not db.session.new and RecordCounter.query.count() == 0
+            db.session.rollback()
+
+        print("✅ Dashboard cache working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Dashboard cache test failed: {e}")
+        return False
+
+def test_custom_record_values():
+    """Test typed value extraction from custom record data."""
+    print("🧪 Testing custom record values...")
+
+    try:
+        from datetime import date
+        from app import build_custom_record_values
+
+        fields = [
+            {'name': 'name', 'type': 'text', 'label': 'Name'},
+            {'name': 'price', 'type': 'number', 'label': 'Price'},
+            {'name': 'launched', 'type': 'date', 'label': 'Launched'},
+            {'name': 'notes', 'type': 'textarea', 'label': 'Notes'}
+        ]
+        data = {'name': 'Widget', 'price': '12.50', 'launched': '2024-03-01', 'notes': ''}
+        values = {value['field_name']: value for value in build_custom_record_values(1, fields, data)}
+
+        assert set(values) == {'name', 'price', 'launched', 'notes'}
+        assert values['name']['value_text'] == 'Widget'
+        assert values['price']['value_number'] == 12.5
+        assert values['launched']['value_date'] == date(2024, 3, 1)
+        assert values['notes']['value_text'] == ''
+
+        # Missing and invalid values store the sort sentinel, never NULL
+        values = {value['field_name']: value for value in build_custom_record_values(1, fields, {'price': 'n/a'})}
+        assert values['price']['value_text'] == 'n/a' and values['price']['value_number'] == float('-inf')
+        assert values['launched']['value_date'] == date.min and values['name']['value_text'] == ''
+
+        print("✅ Custom record values working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Custom record values test failed: {e}")
+        return False
+
+def test_custom_record_filters():
+    """Test that custom record filters and sorting run in SQL."""
+    print("🧪 Testing custom record filters...")
+
+    try:
+        from app import app, db, CustomObject, CustomRecord, paginate_custom_records
+
+        fields = [
+            {'name': 'name', 'type': 'text', 'label': 'Name'},
+            {'name': 'price', 'type': 'number', 'label': 'Price'}
+        ]
+
+        with app.test_request_context():
+            db.create_all()
+
+            custom_object = CustomObject(name='FilterTest', label='Filter Test', fields=json.dumps(fields))
+            db.session.add(custom_object)
+            db.session.flush()
+            for name, price in [('Alpha', '10'), ('Alpine', '25'), ('Beta', '40'), ('Alto', '')]:
+                db.session.add(CustomRecord(object_id=custom_object.id, data=json.dumps({'name': name, 'price': price})))
+            db.session.flush()
+
+            def names(args):
+                page = paginate_custom_records(custom_object.id, fields, args)
+                return [json.loads(record.data)['name'] for record in page.items]
+
+            assert names({'f.name': 'Alp', 'sort': 'name'}) == ['Alpha', 'Alpine']
+            assert names({'f.price.min': '20', 'sort': 'price', 'dir': 'desc'}) == ['Beta', 'Alpine']
+            assert names({'sort': 'price'}) == ['Alto', 'Alpha', 'Alpine', 'Beta']
+            assert names({'f.price.max': '30', 'sort': 'price'}) == ['Alpha', 'Alpine']
+            assert names({'sort': 'price', 'dir': 'desc', 'per_page': '2'}) == ['Beta', 'Alpine']
+            page = paginate_custom_records(custom_object.id, fields, {'sort': 'price', 'dir': 'desc', 'per_page': '2'})
+            assert names({'sort': 'price', 'dir': 'desc', 'per_page': '2', 'cursor': page.next_cursor}) == ['Alpha', 'Alto']
+
+            db.session.rollback()
+
+        print("✅ Custom record filters working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Custom record filter test failed: {e}")
+        return False
+
+def test_custom_schema_cache():
+    """Test that compiled custom object schemas are reused until the definition changes."""
+    print("🧪 Testing custom schema cache...")
+
+    try:
+        from app import CustomObject, get_custom_schema
+
+        fields = [
+            {'name': 'price', 'type': 'number', 'label': 'Price'},
+            {'name': 'email', 'type': 'email', 'label': 'Email'}
+        ]
+        custom_object = CustomObject(id=-1, name='SchemaTest', label='Schema Test', fields=json.dumps(fields))
+
+        schema = get_custom_schema(custom_object)
+        assert [field['name'] for field in schema.fields] == ['price', 'email']
+        assert get_custom_schema(custom_object) is schema
+        assert schema.coerce('price', '12.5') == 12.5
+        assert schema.validate({'price': 'abc', 'email': 'nobody'}) == [
+            'Price must be a valid number', 'Email must be a valid email'
+        ]
+        assert schema.validate({'price': '', 'email': 'a@b.com'}) == []
+
+        custom_object.fields = json.dumps(fields[:1])
+        assert get_custom_schema(custom_object) is not schema
+        assert len(get_custom_schema(custom_object).fields) == 1
+
+        print("✅ Custom schema cache working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Custom schema cache test failed: {e}")
+        return False
+
+def test_import_rows():
+    """Test validation of bulk import rows against the model columns."""
+    print("🧪 Testing import row validation...")
+
+    try:
+        import io
+        from datetime import date
+        from app import Lead, Opportunity, import_columns, coerce_import_row, read_import_rows
+
+        columns = import_columns(Opportunity)
+        values, errors = coerce_import_row(columns, {'name': 'Deal', 'amount': '12.5', 'close_date': '2024-03-01'})
+        assert errors == []
+        assert values['amount'] == 12.5 and values['close_date'] == date(2024, 3, 1)
+        assert values['account_id'] is None and values['created_at'] is not None
+
+        values, errors = coerce_import_row(columns, {'amount': 'lots', 'color': 'red'})
+        assert errors == ['unknown column color', 'name is required', 'amount must be a valid float']
+
+        values, errors = coerce_import_row(import_columns(Lead), {'first_name': 'Ada', 'last_name': 'Lovelace'})
+        assert errors == [] and values['status'] == 'New'
+
+        stream = io.StringIO('{"first_name": "Ada"}\n\nnot json\n[1]\n')
+        rows = list(read_import_rows(stream, 'ndjson', import_columns(Lead)))
+        assert rows == [(1, {'first_name': 'Ada'}, None), (2, None, 'invalid JSON'), (3, None, 'expected a JSON object')]
+
+        stream = io.StringIO('first_name,last_name\nAda,Lovelace,extra\n')
+        assert list(read_import_rows(stream, 'csv', import_columns(Lead)))[0][2] == 'too many values'
+
+        # Only the batch's own rows are indexed, even if another writer commits
+        # a row (and its search document) in the middle of the batch
+        import app as crm
+        from app import app, db, ImportJob, ImportRowError, import_batch, index_search_rows, init_schema, search_documents
+
+        def racing_insert(connection, model, rows):
+            racer_id = connection.execute(
+                db.insert(Lead).values(first_name='Racing', last_name='Writer').returning(Lead.id)
+            ).scalar()
+            index_search_rows(connection, 'lead', Lead.id == racer_id)
+            return insert_import_rows(connection, model, rows)
+
+        insert_import_rows = crm.insert_import_rows
+        crm.insert_import_rows = racing_insert
+        job_id = None
+        try:
+            with app.app_context():
+                init_schema()
+                job = ImportJob(object_type='lead', format='csv')
+                db.session.add(job)
+                db.session.commit()
+                job_id = job.id
+                import_batch(job, Lead, import_columns(Lead), [
+                    (1, {'first_name': 'Imported', 'last_name': 'Racewell'}, None),
+                    (2, {'first_name': 'Imported', 'last_name': 'Racewood'}, None)
+                ])
+                assert job.inserted == 2
+                assert len(search_documents('imported', ['lead'])[0]) == 2
+                assert len(search_documents('racing', ['lead'])[0]) == 1
+        finally:
+            crm.insert_import_rows = insert_import_rows
+            with app.app_context():
+                for lead in Lead.query.filter(Lead.last_name.in_(['Racewell', 'Racewood', 'Writer'])).all():
+                    db.session.delete(lead)
+                if job_id:
+                    db.session.execute(db.delete(ImportRowError).where(ImportRowError.job_id == job_id))
+                    db.session.execute(db.delete(ImportJob).where(ImportJob.id == job_id))
+                db.session.commit()
+
+        print("✅ Import row validation working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Import row validation test failed: {e}")
+        return False
+
+def test_export_lines():
+    """Test that exports are written in chunks with custom data flattened in field order."""
+    print("🧪 Testing streaming export...")
+
+    try:
+        from datetime import date
+        from app import app, db, CustomObject, CustomRecord, export_lines, export_custom_records
+
+        chunks = list(export_lines(['id', 'day'], [[1, date(2024, 1, 2)], [2, None], [3, None]], 'csv', batch_size=2))
+        assert chunks == ['id,day\r\n', '1,2024-01-02\r\n2,\r\n', '3,\r\n']
+
+        chunks = list(export_lines(['id', 'day'], [[1, date(2024, 1, 2)]], 'ndjson'))
+        assert ''.join(chunks) == '{"id": 1, "day": "2024-01-02"}\n'
+
+        fields = [
+            {'name': 'sku', 'type': 'text', 'label': 'SKU'},
+            {'name': 'price', 'type': 'number', 'label': 'Price'}
+        ]
+        with app.app_context():
+            db.create_all()
+            custom_object = CustomObject(name='ExportTest', label='Export Test', fields=json.dumps(fields))
+            db.session.add(custom_object)
+            db.session.flush()
+            db.session.add(CustomRecord(object_id=custom_object.id, data=json.dumps({'price': '5', 'sku': 'A-1', 'old': 'x'})))
+            db.session.flush()
+
+            lines = ''.join(export_custom_records(custom_object, 'csv')).splitlines()
+            assert lines[0] == 'id,created_at,sku,price'
+            assert lines[1].endswith(',A-1,5')
+
+            db.session.rollback()
+
+        print("✅ Streaming export working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Streaming export test failed: {e}")
+        return False
+
+def test_api_permissions():
+    """Test that the JSON API applies the same permission rules as the HTML views."""
+    print("🧪 Testing JSON API permissions...")
+
+    try:
+        from werkzeug.security import generate_password_hash
+        from app import app, db, User, UserPermission, CustomObject, bump_permission_version
+
+        with app.app_context():
+            db.create_all()
+            user = User(username='api_test', email='api_test@crm.com', password_hash=generate_password_hash('secret'), role='user')
+            granted = CustomObject(name='api_test_granted', label='Granted', fields='[]')
+            hidden = CustomObject(name='api_test_hidden', label='Hidden', fields='[]')
+            db.session.add_all([user, granted, hidden])
+            db.session.flush()
+            db.session.add(UserPermission(user_id=user.id, object_type='contact', can_view=True))
+            db.session.add(UserPermission(user_id=user.id, object_type='custom_object', object_id=granted.id, can_view=True))
+            bump_permission_version()
+            db.session.commit()
+            user_id, granted_id, hidden_id = user.id, granted.id, hidden.id
+
+        try:
+            client = app.test_client()
+            assert client.get('/api/v1/contacts').status_code == 401
+
+            client.post('/login', data={'username': 'api_test', 'password': 'secret'})
+            response = client.get('/api/v1/contacts?per_page=1')
+            assert response.status_code == 200 and 'next_cursor' in response.get_json()
+
+            response = client.post('/api/v1/contacts', json={'records': [{'first_name': 'No', 'last_name': 'Access'}]})
+            assert response.status_code == 403
+            assert client.get('/api/v1/leads').status_code == 403
+            assert client.delete('/api/v1/contacts', json={'ids': []}).status_code == 403
+
+            # Custom record exports follow the per-object grant
+            assert client.get(f'/custom-objects/{granted_id}/records/export').status_code == 200
+            assert client.get(f'/custom-objects/{hidden_id}/records/export').status_code == 302
+        finally:
+            with app.app_context():
+                UserPermission.query.filter_by(user_id=user_id).delete()
+                CustomObject.query.filter(CustomObject.id.in_([granted_id, hidden_id])).delete()
+                db.session.delete(db.session.get(User, user_id))
+                bump_permission_version()
+                db.session.commit()
+
+        print("✅ JSON API permissions working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ JSON API permission test failed: {e}")
+        return False
+
+def test_typeahead():
+    """Test case-insensitive prefix matching for the opportunity form lookups."""
+    print("🧪 Testing typeahead lookups...")
+
+    try:
+        from app import app, db, Account, Contact, typeahead_accounts, typeahead_contacts
+
+        with app.app_context():
+            db.create_all()
+            db.session.add_all([
+                Account(name='Zebra Typeahead Ltd'),
+                Contact(first_name='Zelda', last_name='Typeahead', company='Hyrule'),
+                Contact(first_name='Zed', last_name='Zyx')
+            ])
+            db.session.flush()
+
+            assert [label for _, label in typeahead_accounts('zebra t', 10)] == ['Zebra Typeahead Ltd']
+            assert [label for _, label in typeahead_contacts('typeah', 10)] == ['Zelda Typeahead (Hyrule)']
+            assert [label for _, label in typeahead_contacts('zelda typ', 10)] == ['Zelda Typeahead (Hyrule)']
+            assert len(typeahead_contacts('z', 1)) == 1
+
+            db.session.rollback()
+
+        print("✅ Typeahead lookups working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Typeahead test failed: {e}")
+        return False
+
+def test_search_index():
+    """Test that search documents follow creates, edits and deletes."""
+    print("🧪 Testing full-text search...")
+
+    try:
+        from app import app, db, Contact, Lead, ensure_search_index, search_documents
+
+        def hits(query, object_types=('contact', 'lead')):
+            return [(hit.object_type, hit.title) for hit in search_documents(query, object_types)[0]]
+
+        with app.app_context():
+            db.create_all()
+            ensure_search_index()
+            contact = Contact(first_name='Quintessa', last_name='Searchwell', email='qs@fulltext.example')
+            lead = Lead(first_name='Quint', last_name='Lead', notes='Met Searchwell at the fulltext conference')
+            db.session.add_all([contact, lead])
+            db.session.flush()
+
+            # Name matches rank above body matches
+            assert hits('searchwell') == [('contact', 'Quintessa Searchwell'), ('lead', 'Quint Lead')]
+            assert hits('quin fullt') == [('contact', 'Quintessa Searchwell'), ('lead', 'Quint Lead')]
+            assert hits('searchwell', ['lead']) == [('lead', 'Quint Lead')]
+
+            contact.email = 'qs@elsewhere.example'
+            db.session.flush()
+            assert hits('fulltext') == [('lead', 'Quint Lead')]
+
+            db.session.delete(lead)
+            db.session.flush()
+            assert hits('quint') == [('contact', 'Quintessa Searchwell')]
+
+            db.session.rollback()
+            assert hits('quintessa') == []
+
+        print("✅ Full-text search working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Full-text search test failed: {e}")
+        return False
+
+def test_autocomplete_index():
+    """Test prefix lookups and incremental updates of the autocomplete index."""
+    print("🧪 Testing autocomplete index...")
+
+    try:
+        from types import SimpleNamespace
+        from app import PrefixIndex, autocomplete_entry
+
+        def person(id, first_name, last_name, email=None, phone=None):
+            return SimpleNamespace(id=id, first_name=first_name, last_name=last_name, email=email, phone=phone, company=None)
+
+        index = PrefixIndex(max_age=300)
+        index.load([
+            autocomplete_entry('contact', person(1, 'Ada', 'Lovelace', 'ada@engine.org', '+1 (555) 010-2000')),
+            autocomplete_entry('contact', person(2, 'Adam', 'Smith', 'adam@wealth.org')),
+            autocomplete_entry('lead', person(1, 'Grace', 'Hopper', phone='555-0199'))
+        ])
+
+        labels = lambda query, types=('contact', 'lead'): [entry[2] for entry in index.search(query, set(types))]
+        assert labels('ad') == ['Ada Lovelace', 'Adam Smith']
+        assert labels('ada') == ['Ada Lovelace', 'Adam Smith']  # exact token match ranks first
+        assert labels('ada love') == ['Ada Lovelace']
+        assert labels('adam@w') == ['Adam Smith']
+        assert labels('555 0102') == ['Ada Lovelace']
+        assert labels('hop', ['contact']) == []
+
+        index.apply({('lead', 1): None, ('lead', 2): autocomplete_entry('lead', person(2, 'Adele', 'Jones'))})
+        assert labels('hop') == []
+        assert labels('ade') == ['Adele Jones']
+
+        report = index.memory_report(budget_bytes=1024 * 1024)
+        assert report['records'] == 3 and report['within_budget']
+
+        # More tokens share the prefix than one lookup examines before ranking
+        crowded = PrefixIndex(max_age=300)
+        crowded.load([autocomplete_entry('contact', person(id, 'Jo', f'Jones{id:04d}')) for id in range(1, 1201)]
+                     + [autocomplete_entry('lead', person(1, 'Joy', 'Smith'))])
+        assert [entry[2] for entry in crowded.search('jo smith', {'contact', 'lead'})] == ['Joy Smith']
+        assert [entry[2] for entry in crowded.search('jo', {'lead'})] == ['Joy Smith']
+        assert [entry[2] for entry in crowded.search('jones1199', {'contact'})] == ['Jo Jones1199']
+        assert len(crowded.search('jo', {'contact'}, limit=10)) == 10
+
+        print("✅ Autocomplete index working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Autocomplete index test failed: {e}")
+        return False
+
+def test_engine_config():
+    """Test per-backend engine options, SQLite pragmas and pool metrics."""
+    print("🧪 Testing engine configuration...")
+
+    try:
+        from app import app, db, create_app, engine_options, pool_stats, MeteredQueuePool
+
+        # One shared app whose database is fixed at import
+        assert create_app() is app and create_app({}) is app
+        try:
+            create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+            assert False, 'database override accepted'
+        except ValueError as e:
+            assert 'SQLALCHEMY_DATABASE_URI' in str(e)
+
+        postgres = engine_options('postgresql://crm@localhost/crm')
+        assert postgres['poolclass'] is MeteredQueuePool
+        assert postgres['pool_pre_ping'] and postgres['pool_recycle'] == app.config['DB_POOL_RECYCLE']
+        assert engine_options('sqlite://') == {}
+        assert engine_options('sqlite:///crm.db')['connect_args']['timeout'] == app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000
+
+        with app.app_context():
+            before = pool_stats()['checkouts']
+            with db.engine.connect() as connection:
+                assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+                assert connection.exec_driver_sql('PRAGMA busy_timeout').scalar() == app.config['SQLITE_BUSY_TIMEOUT_MS']
+                stats = pool_stats()
+                assert stats['pool'] == 'MeteredQueuePool' and stats['checked_out'] >= 1
+            assert pool_stats()['checkouts'] == before + 1
+
+        print("✅ Engine configuration working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Engine configuration test failed: {e}")
+        return False
+
+def test_replica_routing():
+    """Test that GET reads use a replica except right after the user's own writes."""
+    print("🧪 Testing read replica routing...")
+
+    import tempfile
+    from flask import session
+    from app import (app, db, Lead, bump_permission_version, get_permission_version, permission_grants_query,
+                     replica_engines)
+
+    replica_dir = tempfile.mkdtemp(prefix='crm-replica-')
+    app.config['DATABASE_REPLICA_URLS'] = ['sqlite:///' + os.path.join(replica_dir, 'replica.db')]
+    lead_id = None
+    try:
+        db.metadata.create_all(replica_engines()[0])
+
+        with app.test_request_context('/leads/new', method='POST'):
+            lead = Lead(first_name='Replica', last_name='Probe')
+            db.session.add(lead)
+            db.session.commit()
+            lead_id = lead.id
+            pinned = session.get('primary_until')
+        assert pinned
+
+        # The replica has not seen the new lead; the primary has
+        with app.test_request_context('/leads'):
+            assert db.session.get(Lead, lead_id) is None
+        with app.test_request_context('/leads'):
+            session['primary_until'] = pinned
+            assert db.session.get(Lead, lead_id) is not None
+
+        # Permission versions and grants are always read from the primary
+        with app.app_context():
+            bump_permission_version()
+            db.session.commit()
+            version = get_permission_version()
+        with app.test_request_context('/leads'):
+            assert get_permission_version() == version
+            assert db.session.get_bind(clause=permission_grants_query(1)) is db.engine
+            assert db.session.get_bind(clause=db.select(Lead.id)) is replica_engines()[0]
+
+        print("✅ Read replica routing working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Read replica routing test failed: {e}")
+        return False
+    finally:
+        app.config['DATABASE_REPLICA_URLS'] = []
+        replica_engines()
+        if lead_id:
+            with app.app_context():
+                db.session.delete(db.session.get(Lead, lead_id))
+                db.session.commit()
+
+def test_sql_instrumentation():
+    """Test per-request query counts, the timing header and the slow query log."""
+    print("🧪 Testing SQL instrumentation...")
+
+    import logging
+    from app import app, parameter_shape
+
+    class Collect(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.messages = []
+
+        def emit(self, record):
+            self.messages.append(record.getMessage())
+
+    handler = Collect()
+    app.logger.addHandler(handler)
+    saved = {key: app.config[key] for key in ('SQL_TIMING_HEADER', 'SLOW_QUERY_MS')}
+    app.config.update(SQL_TIMING_HEADER=True, SLOW_QUERY_MS=0)
+    user_id = create_probe_admin('sql_timing_probe')
+    try:
+        assert parameter_shape({'id': 1, 'name': 'x'}) == '{id: int, name: str}'
+        assert parameter_shape([(1, 'a'), (2, 'b')], executemany=True) == '2 x (int, str)'
+
+        client = app.test_client()
+        assert client.post('/login', data={'username': 'sql_timing_probe', 'password': 'secret'}).status_code == 302
+        response = client.get('/contacts')
+        assert response.status_code == 200
+        timing = response.headers.get('Server-Timing', '')
+        assert timing.startswith('db;dur=') and 'queries' in timing
+        assert int(timing.split('desc="')[1].split()[0]) > 0
+        assert any('GET contacts' in message and 'params=' in message for message in handler.messages)
+
+        print("✅ SQL instrumentation working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ SQL instrumentation test failed: {e}")
+        raise
+    finally:
+        app.logger.removeHandler(handler)
+        app.config.update(saved)
+        delete_probe_user(user_id)
+
+def test_metrics():
+    """Test the /metrics exposition and merging of worker snapshots."""
+    print("🧪 Testing metrics endpoint...")
+
+    import tempfile
+    from app import app, metric_labels
+
+    metrics_dir = tempfile.mkdtemp(prefix='crm-metrics-')
+    user_id = create_probe_admin('metrics_probe')
+    try:
+        client = app.test_client()
+        assert client.post('/login', data={'username': 'metrics_probe', 'password': 'secret'}).status_code == 302
+        assert client.get('/contacts').status_code == 200
+
+        body = client.get('/metrics').get_data(as_text=True)
+        assert '# TYPE crm_request_duration_seconds histogram' in body
+        assert 'crm_request_duration_seconds_bucket{endpoint="contacts",method="GET",le="+Inf"}' in body
+        assert 'crm_template_render_seconds_count{template="contacts.html"}' in body
+        assert 'crm_cache_hits_total{cache="permission"}' in body
+        assert 'crm_db_pool_in_use' in body
+
+        # A worker that has exited: its counters still count, its gauges do not
+        labels = metric_labels(endpoint='contacts', method='GET')
+        with open(os.path.join(metrics_dir, 'worker-999999999.json'), 'w') as f:
+            json.dump({'pid': 999999999, 'counters': {'crm_db_queries_total': {labels: 1000}},
+                       'gauges': {'crm_db_pool_in_use': {'': 1000}}, 'histograms': {}}, f)
+        app.config['METRICS_DIR'] = metrics_dir
+        body = client.get('/metrics').get_data(as_text=True)
+        queries = next(line for line in body.splitlines() if line.startswith(f'crm_db_queries_total{{{labels}}}'))
+        in_use = next(line for line in body.splitlines() if line.startswith('crm_db_pool_in_use '))
+        assert int(queries.split()[-1]) > 1000 and int(in_use.split()[-1]) < 1000
+        assert os.path.exists(os.path.join(metrics_dir, f'worker-{os.getpid()}.json'))
+
+        print("✅ Metrics endpoint working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Metrics endpoint test failed: {e}")
+        raise
+    finally:
+        app.config['METRICS_DIR'] = None
+        delete_probe_user(user_id)
+
+def test_password_hashing():
+    """Test rehash on login and the queue limit of the hashing pool."""
+    print("🧪 Testing password hashing...")
+
+    import threading
+    from werkzeug.security import generate_password_hash
+    from app import app, db, User, PasswordHasher, PasswordHasherBusy, password_needs_rehash
+
+    saved = {key: app.config[key] for key in ('PASSWORD_HASH_WORKERS', 'PASSWORD_HASH_QUEUE_LIMIT')}
+    user_id = None
+    try:
+        with app.app_context():
+            user = User(username='rehash_probe', email='rehash_probe@crm.com',
+                        password_hash=generate_password_hash('secret', 'pbkdf2:sha256:1000'))
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+            assert password_needs_rehash(user.password_hash)
+
+        response = app.test_client().post('/login', data={'username': 'rehash_probe', 'password': 'secret'})
+        assert response.status_code == 302
+        with app.app_context():
+            assert db.session.get(User, user_id).password_hash.startswith(app.config['PASSWORD_HASH_METHOD'] + '$')
+
+        app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE_LIMIT=0)
+        hasher = PasswordHasher()
+        release = threading.Event()
+        blocker = threading.Thread(target=hasher._run, args=('verify', release.wait))
+        blocker.start()
+        while hasher.stats()['in_flight'] == 0:
+            release.wait(0.01)
+        try:
+            hasher.verify('pbkdf2:sha256:1000$salt$hash', 'secret')
+            assert False, "expected the pool to refuse a second check"
+        except PasswordHasherBusy:
+            pass
+        release.set()
+        blocker.join()
+        assert hasher.stats()['rejected'] == 1
+
+        print("✅ Password hashing working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Password hashing test failed: {e}")
+        return False
+    finally:
+        app.config.update(saved)
+        if user_id:
+            with app.app_context():
+                db.session.delete(db.session.get(User, user_id))
+                db.session.commit()
+
+def test_login_throttle():
+    """Test sliding-window login limits and that throttled attempts skip the database."""
+    print("🧪 Testing login throttling...")
+
+    import time
+    from app import app, login_throttle, LoginThrottle, MemoryWindowCounter, RedisWindowCounter
+
+    class LocalRedis:
+        """Stand-in for the few redis.Redis calls RedisWindowCounter makes."""
+
+        def __init__(self):
+            self.values = {}
+            self.commands = []
+
+        def mget(self, keys):
+            return [self.values.get(key) for key in keys]
+
+        def delete(self, *keys):
+            for key in keys:
+                self.values.pop(key, None)
+
+        def pipeline(self):
+            return self
+
+        def incr(self, key):
+            self.commands.append(lambda: self.values.__setitem__(key, self.values.get(key, 0) + 1))
+
+        def expire(self, key, seconds):
+            pass
+
+        def execute(self):
+            for command in self.commands:
+                command()
+            self.commands = []
+
+    saved = {key: app.config[key] for key in ('LOGIN_MAX_FAILURES_PER_USERNAME', 'LOGIN_WINDOW_SECONDS', 'SQL_TIMING_HEADER')}
+    saved_backend = login_throttle.backend
+    try:
+        app.config.update(LOGIN_MAX_FAILURES_PER_USERNAME=2, LOGIN_WINDOW_SECONDS=60)
+        throttle = LoginThrottle(MemoryWindowCounter(max_keys=2))
+        throttle.record_failure('ada', now=30)
+        throttle.record_failure('ada', now=50)
+        assert throttle.retry_after('10.0.0.1', 'ada', now=55) == 5
+        # Halfway through the next window half of the old failures still count
+        assert throttle.retry_after('10.0.0.1', 'ada', now=90) == 0
+        throttle.record_failure('ada', now=90)
+        assert throttle.retry_after('10.0.0.1', 'ada', now=90) > 0
+        throttle.record_success('ada')
+        assert throttle.retry_after('10.0.0.1', 'ada', now=91) == 0
+        throttle.record_attempt('10.0.0.2', now=91)
+        throttle.record_attempt('10.0.0.3', now=91)
+        assert len(throttle.backend._windows) <= 2
+
+        # Shared backend, against a local stand-in for Redis
+        shared = LoginThrottle(RedisWindowCounter(client=LocalRedis()))
+        now = time.time()
+        for _ in range(2):
+            shared.record_failure('bob', now=now)
+        assert shared.retry_after('10.0.0.1', 'bob', now=now) > 0
+        shared.record_success('bob')
+        assert shared.retry_after('10.0.0.1', 'bob', now=now) == 0
+
+        login_throttle.backend = MemoryWindowCounter(max_keys=1000)
+        app.config['SQL_TIMING_HEADER'] = True
+        client = app.test_client()
+        for _ in range(2):
+            assert client.post('/login', data={'username': 'admin', 'password': 'wrong'}).status_code == 200
+        response = client.post('/login', data={'username': 'Admin', 'password': 'admin123'})
+        assert response.status_code == 429 and int(response.headers['Retry-After']) > 0
+        assert '"0 queries"' in response.headers['Server-Timing']
+
+        print("✅ Login throttling working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Login throttling test failed: {e}")
+        return False
+    finally:
+        app.config.update(saved)
+        login_throttle.backend = saved_backend
+
+def test_identity_cache():
+    """Test that signed-in users are served from the identity cache and deactivation still applies."""
+    print("🧪 Testing identity cache...")
+
+    import time
+    from werkzeug.security import generate_password_hash
+    from app import app, db, User, TTLCache, identity_cache, load_user
+
+    saved_ttl = identity_cache.ttl
+    user_id = None
+    try:
+        with app.app_context():
+            user = User(username='identity_probe', email='identity_probe@crm.com',
+                        password_hash=generate_password_hash('secret', app.config['PASSWORD_HASH_METHOD']))
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+
+        client = app.test_client()
+        assert client.post('/login', data={'username': 'identity_probe', 'password': 'secret'}).status_code == 302
+        assert client.get('/').status_code == 200
+        hits = identity_cache.hits
+        assert client.get('/').status_code == 200
+        assert identity_cache.hits > hits
+
+        with app.app_context():
+            cached = load_user(str(user_id))
+            assert cached.username == 'identity_probe' and cached.is_active and cached.get_id() == str(user_id)
+            assert not hasattr(cached, 'password_hash')
+
+            # Deactivated through the ORM: this worker forgets the user at once
+            db.session.get(User, user_id).is_active = False
+            db.session.commit()
+        assert client.get('/').status_code == 302
+
+        # Changed behind this worker's back: noticed once the entry expires
+        with app.app_context():
+            db.session.get(User, user_id).is_active = True
+            db.session.commit()
+        assert client.get('/').status_code == 200
+        identity_cache.ttl = 0.05
+        identity_cache.clear()
+        assert client.get('/').status_code == 200
+        with app.app_context():
+            db.session.execute(db.update(User).where(User.id == user_id).values(is_active=False))
+            db.session.commit()
+        time.sleep(0.1)
+        assert client.get('/').status_code == 302
+
+        # Bounded: expired entries go on the next set, and maxsize evicts the oldest
+        bounded = TTLCache(0.05, maxsize=2)
+        bounded.set('stale', 1)
+        time.sleep(0.1)
+        bounded.set('a', 1)
+        assert bounded.stats()['size'] == 1 and bounded.get('stale') is None
+        bounded.ttl = 60
+        bounded.set('b', 2)
+        bounded.set('c', 3)
+        assert bounded.get('a') is None and bounded.get('c') == 3
+        assert bounded.stats()['evictions'] == 1
+
+        print("✅ Identity cache working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Identity cache test failed: {e}")
+        return False
+    finally:
+        identity_cache.ttl = saved_ttl
+        identity_cache.clear()
+        if user_id:
+            with app.app_context():
+                db.session.delete(db.session.get(User, user_id))
+                db.session.commit()
+
+def test_permission_sync():
+    """Test that permission saves only touch the rows that changed."""
+    print("🧪 Testing permission diffing...")
+
+    from werkzeug.datastructures import MultiDict
+    from app import app, db, User, UserPermission, UserPermissionSet, PermissionSet
+    from app import permission_form_grants, sync_permission_rows, sync_permission_set_assignments
+
+    user_id = None
+    set_ids = []
+    try:
+        with app.app_context():
+            user = User(username='sync_probe', email='sync_probe@crm.com', password_hash='x')
+            sets = [PermissionSet(name=f'Sync probe {number}') for number in range(3)]
+            db.session.add_all([user] + sets)
+            db.session.commit()
+            user_id, set_ids = user.id, [permission_set.id for permission_set in sets]
+
+            sync = lambda form: sync_permission_rows(UserPermission, UserPermission.user_id, user_id,
+                                                     permission_form_grants(MultiDict(form), []))
+            assert sync({'contact_view': 'on', 'lead_view': 'on', 'lead_edit': 'on'}) == (2, 0, 0)
+            ids = {row.object_type: row.id for row in UserPermission.query.filter_by(user_id=user_id)}
+            assert sync({'contact_view': 'on', 'lead_view': 'on', 'lead_edit': 'on'}) == (0, 0, 0)
+            assert sync({'contact_view': 'on', 'contact_create': 'on', 'account_view': 'on'}) == (1, 1, 1)
+            rows = {row.object_type: row for row in UserPermission.query.filter_by(user_id=user_id)}
+            assert set(rows) == {'contact', 'account'} and rows['contact'].id == ids['contact']
+            assert rows['contact'].can_create and not rows['contact'].can_edit
+
+            assign = lambda selected: sync_permission_set_assignments(user_id, selected, user_id)
+            assigned = lambda: [row.permission_set_id for row in
+                                UserPermissionSet.query.filter_by(user_id=user_id).order_by(UserPermissionSet.id)]
+            assert assign(set_ids[:2]) == (2, 0, 0)
+            kept = UserPermissionSet.query.filter_by(user_id=user_id, permission_set_id=set_ids[0]).one().id
+            assert assign(set_ids[:1] + set_ids[2:]) == (1, 0, 1)
+            assert UserPermissionSet.query.filter_by(user_id=user_id, permission_set_id=set_ids[0]).one().id == kept
+
+            # The form's order is the assignment order, which decides conflicting grants
+            assert assign([set_ids[2], set_ids[0]]) == (0, 2, 0)
+            assert assigned() == [set_ids[2], set_ids[0]]
+            assert assign([set_ids[2], set_ids[0]]) == (0, 0, 0)
+            assert assign([set_ids[2], set_ids[1], set_ids[0]]) == (1, 1, 0)
+            assert assigned() == [set_ids[2], set_ids[1], set_ids[0]]
+            db.session.commit()
+
+        print("✅ Permission diffing working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Permission diffing test failed: {e}")
+        return False
+    finally:
+        with app.app_context():
+            db.session.rollback()
+            UserPermission.query.filter_by(user_id=user_id).delete()
+            UserPermissionSet.query.filter_by(user_id=user_id).delete()
+            PermissionSet.query.filter(PermissionSet.id.in_(set_ids)).delete()
+            User.query.filter_by(id=user_id).delete()
+            db.session.commit()
+
+def test_bulk_provisioning():
+    """Test bulk user creation and bulk permission set assignment."""
+    print("🧪 Testing bulk user provisioning...")
+
+    import tempfile
+    from app import app, db, User, UserPermission, UserPermissionSet, PermissionSet, provision_users
+
+    usernames = ['bulk_probe_1', 'bulk_probe_2', 'bulk_probe_3']
+    set_id = None
+    admin_id = create_probe_admin('bulk_probe_admin')
+    try:
+        with app.app_context():
+            records = [
+                {'username': 'bulk_probe_1', 'email': 'bulk_probe_1@crm.com', 'password': 'secret'},
+                {'username': 'bulk_probe_2', 'email': 'bulk_probe_1@crm.com', 'password': 'secret', 'role': 'owner'},
+                {'username': 'bulk_probe_admin', 'email': 'bulk_probe_3@crm.com', 'password': 'secret', 'role': 'admin'}
+            ]
+            assert provision_users([]) == ([], [])
+            ids, errors = provision_users(records, hash_method='pbkdf2:sha256:1000')
+            assert ids == [] and [error['index'] for error in errors] == [1, 2]
+            assert errors[0]['messages'] == ['role must be one of: admin, manager, user', 'email repeats record 0']
+            assert errors[1]['messages'] == ['Username already exists']
+            assert User.query.filter(User.username.in_(usernames)).count() == 0
+
+            records[1].update(email='bulk_probe_2@crm.com', role='manager')
+            records[2]['username'] = 'bulk_probe_3'
+            ids, errors = provision_users(records, hash_method='pbkdf2:sha256:1000')
+            assert not errors and len(ids) == 3
+            assert UserPermission.query.filter(UserPermission.user_id.in_(ids)).count() == 4 * 2  # admins get none
+
+            permission_set = PermissionSet(name='Bulk probe set')
+            db.session.add(permission_set)
+            db.session.commit()
+            set_id = permission_set.id
+
+        client = app.test_client()
+        assert client.post('/login', data={'username': 'bulk_probe_admin', 'password': 'secret'}).status_code == 302
+        body = {'user_ids': ids[:2], 'permission_set_ids': [set_id]}
+        assert client.post('/api/v1/users/permission-sets', json=body).get_json() == {'assigned': 2}
+        assert client.post('/api/v1/users/permission-sets', json=body).get_json() == {'assigned': 0}
+        assert client.delete('/api/v1/users/permission-sets', json=body).get_json() == {'unassigned': 2}
+        assert client.post('/api/v1/users/permission-sets', json={'user_ids': [0], 'permission_set_ids': [set_id]}).status_code == 422
+
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('bulk_probe_1\nbulk_probe_3\n\n')
+        result = app.test_cli_runner().invoke(args=['assign-permission-sets', f.name, '--set', 'Bulk probe set',
+                                                         '--assigned-by', 'bulk_probe_admin'])
+        os.unlink(f.name)
+        assert result.exit_code == 0 and 'Added 2 assignments across 2 users' in result.output
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('username,email,password,role\n')
+        result = app.test_cli_runner().invoke(args=['create-users', f.name])
+        os.unlink(f.name)
+        assert result.exit_code != 0 and 'No users found' in result.output
+
+        print("✅ Bulk user provisioning working correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Bulk user provisioning test failed: {e}")
+        raise
+    finally:
+        with app.app_context():
+            db.session.rollback()
+            ids = db.session.execute(db.select(User.id).where(User.username.in_(usernames))).scalars().all()
+            UserPermission.query.filter(UserPermission.user_id.in_(ids)).delete()
+            UserPermissionSet.query.filter(UserPermissionSet.user_id.in_(ids)).delete()
+            PermissionSet.query.filter_by(id=set_id).delete()
+            User.query.filter(User.id.in_(ids)).delete()
+            db.session.commit()
+        delete_probe_user(admin_id)
+
 def main():
     """Run all tests."""
     print("🚀 Starting Simple CRM Tests...")
@@ -105,15 +1181,40 @@ def main():
         test_imports,
         test_json_filters,
         test_database_connection,
-        test_templates
+        test_templates,
+        test_permission_matrix,
+        test_permission_cache,
+        test_keyset_cursor,
+        test_dashboard_cache,
+        test_custom_record_values,
+        test_custom_record_filters,
+        test_custom_schema_cache,
+        test_import_rows,
+        test_export_lines,
+        test_api_permissions,
+        test_typeahead,
+        test_search_index,
+        test_autocomplete_index,
+        test_engine_config,
+        test_replica_routing,
+        test_sql_instrumentation,
+        test_metrics,
+        test_password_hashing,
+        test_login_throttle,
+        test_identity_cache,
+        test_permission_sync,
+        test_bulk_provisioning
     ]
     
     passed = 0
     total = len(tests)
     
     for test in tests:
-        if test():
-            passed += 1
+        try:
+            if test():
+                passed += 1
+        except Exception:
+            pass  # The test has already printed why it failed
         print()
     
     print("=" * 50)